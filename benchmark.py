@@ -0,0 +1,468 @@
+import gc
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import http.server
+from datetime import datetime, timezone
+
+import downloadModel
+from ollamaClient import OllamaClient
+from registryDownloader import RegistryDownloader, manifest_media_type
+from downloadSchedule import DownloadSchedule
+from downloadTelemetry import Telemetry
+from liveSearch import LiveSearch
+from registryMirror import parse_size, range_regex
+
+
+# Where the reference numbers are kept between runs
+baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarkBaseline.json")
+# Filter expressions timed at every catalog size, covering keywords, sizes and compound terms
+filter_expressions = ['coder', 'model1', '>=7b', '<1b', 'coder >=1b <=8b', 'qwen | llama <8b', 'vision or coder 7b']
+# Pieces the synthetic model names and their parameter tags are made of
+name_stems = ['llama', 'qwen', 'gemma', 'mistral', 'phi', 'deepseek', 'granite', 'smollm', 'falcon', 'olmo']
+name_suffixes = ['', '2', '3', '3.1', '2.5', '-coder', '-vision', '-instruct', '-math', '-embed']
+size_tags = ['135m', '360m', '0.5b', '1b', '1.5b', '3b', '7b', '8b', '13b', '14b', '32b', '70b', '405b']
+
+
+def synthetic_catalog(num_models, seed=0):
+    """Return a library page with num_models models in the markup of ollama.com/library."""
+    rng = random.Random(seed)
+    items = []
+    for i in range(num_models):
+        name = f"{rng.choice(name_stems)}{rng.choice(name_suffixes)}-{i}"
+        tags = rng.sample(size_tags, rng.randint(0, 5))
+        sizes = ''.join(
+            f'<span x-test-size class="inline-flex items-center rounded-md bg-[#ddf4ff] px-2 py-[2px] text-xs sm:text-[13px] font-medium text-blue-600">{tag}</span>'
+            for tag in tags
+        )
+        items.append(
+            f'<li x-test-model class="flex items-baseline border-b border-neutral-200 py-6">'
+            f'<a href="/library/{name}" class="group w-full space-y-5">'
+            f'<div class="space-y-2"><div x-test-model-title title="{name}" class="flex items-center">'
+            f'<h2 class="truncate text-xl font-medium underline-offset-2 group-hover:underline md:text-2xl"><span>{name}</span></h2></div>'
+            f'<p class="max-w-lg break-words text-neutral-800 text-md">{name} is a synthetic model &amp; '
+            f'number {i} of the benchmark catalog, with <code>markup</code> in its description.</p></div>'
+            f'<div class="flex flex-col"><div class="flex flex-wrap space-x-2">{sizes}</div>'
+            f'<p class="my-1 flex space-x-5 text-[13px] font-medium text-neutral-500">'
+            f'<span x-test-pull-count>{rng.randint(1, 999)}K</span><span>Pulls</span></p></div></a></li>'
+        )
+    return ('<!DOCTYPE html><html><head><title>Ollama</title></head><body><main><ul role="list" class="flex flex-col">'
+            + '\n'.join(items) + '</ul></main></body></html>')
+
+
+def best_time(function, repeat):
+    """Return the shortest of `repeat` runs of function in seconds, the one least disturbed by the machine."""
+    best = None
+    gc_was_enabled = gc.isenabled()
+    gc.disable()  # Like timeit, keep collections of earlier garbage out of the measurement
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+
+def bench_catalog(num_models, repeat):
+    """Time parsing, indexing, filtering and rendering a synthetic catalog of num_models models, and typing into the live search."""
+    html = synthetic_catalog(num_models)
+    models, parameters, descriptions = downloadModel.extract_model_data(html)
+    index = downloadModel.build_catalog_index(models, parameters)
+    localmodels = set(index['entries'][::7])
+
+    def filter_all():
+        for expression in filter_expressions:
+            downloadModel.filter_catalog(index, expression)
+
+    def render_all():
+        with contextlib.redirect_stdout(io.StringIO()):
+            downloadModel.display_models(models, parameters, localmodels, descriptions, None, index)
+            for expression in filter_expressions:
+                downloadModel.display_models(models, parameters, localmodels, descriptions, expression, index)
+
+    def type_all():
+        # Every filter typed key by key into the live search, with a 120x40 frame drawn after each key
+        view = LiveSearch(index, localmodels, lambda query: downloadModel.filter_catalog(index, query), output=io.StringIO())
+        for expression in filter_expressions:
+            view.handle_key('clear')
+            for key in expression:
+                view.handle_key(key)
+                view.render(120, 40)
+
+    return {
+        f"parse[{num_models}]": best_time(lambda: downloadModel.extract_model_data(html), repeat),
+        f"index[{num_models}]": best_time(lambda: downloadModel.build_catalog_index(models, parameters), repeat),
+        f"filter[{num_models}]": best_time(filter_all, repeat),
+        f"render[{num_models}]": best_time(render_all, repeat),
+        f"live_search[{num_models}]": best_time(type_all, repeat),
+    }
+
+
+class FakeServer(http.server.ThreadingHTTPServer):
+    """Local stand-in server that delays every response by `latency` seconds and fails `failure_rate` of the transfers."""
+
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0.0, failure_rate=0.0, seed=0):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.failures = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def inject_failure(self):
+        """Decide whether the transfer being served fails."""
+        with self.rng_lock:
+            failed = self.rng.random() < self.failure_rate
+            self.failures += failed
+        return failed
+
+    def failure_point(self, low, high):
+        """Pick where between low and high an injected failure happens."""
+        with self.rng_lock:
+            return self.rng.randint(low, high)
+
+    def handle_error(self, request, client_address):
+        pass  # Clients dropping connections, e.g. after an injected failure, are expected
+
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class FakeOllamaHandler(http.server.BaseHTTPRequestHandler):
+    """The parts of the Ollama REST API the downloader uses. Pulls stream progress lines like the real server and resume after a failure."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.send_json({'models': [{'name': name} for name in self.stored_models()]})
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def stored_models(self):
+        """List the models in the server's model store under the names the real server gives them."""
+        if not self.server.models_dir:
+            return []
+        manifests = os.path.join(self.server.models_dir, 'manifests')
+        names = []
+        for directory, _, tags in os.walk(manifests):
+            parts = os.path.relpath(directory, manifests).split(os.sep)
+            if len(parts) != 3:
+                continue
+            host, namespace, name = parts
+            if host != 'registry.ollama.ai':
+                name = f"{host}/{namespace}/{name}"
+            elif namespace != 'library':
+                name = f"{namespace}/{name}"
+            names += [f"{name}:{tag}" for tag in tags]
+        return names
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.server.latency)
+        if self.path == '/api/show':
+            self.send_json({'details': {'parameter_size': '7B', 'quantization_level': 'Q4_K_M', 'family': 'llama'},
+                            'model_info': {'general.architecture': 'llama', 'llama.context_length': 8192}})
+            return
+        if self.path != '/api/pull':
+            self.send_json({'error': 'not found'}, 404)
+            return
+        model = payload.get('model', '')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send_line(update):
+            line = (json.dumps(update) + '\n').encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+            self.wfile.flush()
+
+        total = self.server.model_size
+        step = max(1, total // self.server.progress_lines)
+        digest = 'sha256:' + hashlib.sha256(model.encode('utf-8')).hexdigest()
+        send_line({'status': 'pulling manifest'})
+        completed = self.server.completed.get(model, 0)
+        fail_at = self.server.failure_point(completed, total) if self.server.inject_failure() else None
+        try:
+            # Like the real server, a layer is first reported with what is already on disk
+            send_line({'status': f"pulling {digest[7:19]}", 'digest': digest, 'total': total, 'completed': completed})
+            while completed < total:
+                time.sleep(self.server.latency)
+                completed = min(total, completed + step)
+                if fail_at is not None and completed >= fail_at:
+                    send_line({'error': 'injected failure'})
+                    return
+                self.server.completed[model] = completed
+                send_line({'status': f"pulling {digest[7:19]}", 'digest': digest, 'total': total, 'completed': completed})
+            send_line({'status': 'success'})
+            self.server.completed.pop(model, None)
+        finally:
+            self.wfile.write(b'0\r\n\r\n')
+
+
+class FakeRegistryHandler(http.server.BaseHTTPRequestHandler):
+    """Manifests and blobs of the registry API, with a redirect to a CDN path and range support like the real registry."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        parts = self.path.split('/')
+        if len(parts) == 6 and parts[4] == 'manifests':
+            raw = self.server.manifests.get(f"{parts[3]}:{parts[5]}")
+            if raw is None:
+                self.send_empty(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', manifest_media_type)
+            self.send_header('Content-Length', str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+        elif len(parts) == 6 and parts[4] == 'blobs':
+            self.send_empty(307, [('Location', f"/cdn/{parts[5]}")])
+        elif len(parts) == 3 and parts[1] == 'cdn' and parts[2] in self.server.blobs:
+            data = self.server.blobs[parts[2]]
+            start, end = 0, len(data) - 1
+            byte_range = range_regex.match(self.headers.get('Range', ''))
+            if byte_range:
+                start = int(byte_range.group(1))
+                end = min(int(byte_range.group(2)), end) if byte_range.group(2) else end
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+            body = data[start:end + 1]
+            if len(body) > 1 and self.server.inject_failure():
+                # Cut the transfer short, as a dropped connection would
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+        else:
+            self.send_empty(404)
+
+
+def fake_ollama(model_size, progress_lines=50, **kwargs):
+    """Start a fake Ollama server whose every model is model_size bytes."""
+    server = FakeServer(FakeOllamaHandler, **kwargs)
+    server.model_size = model_size
+    server.progress_lines = progress_lines
+    server.completed = {}  # Bytes a failed pull got to, so a retry resumes like the real server
+    server.models_dir = None  # Model store whose manifests /api/tags lists, for pulls by the built-in downloader
+    return server
+
+
+def fake_registry(models, layer_sizes, **kwargs):
+    """Start a fake registry serving the given models, each with random layers of layer_sizes bytes."""
+    server = FakeServer(FakeRegistryHandler, **kwargs)
+    server.manifests = {}
+    server.blobs = {}
+    rng = random.Random(1)
+    for model in models:
+        layers = []
+        for size in layer_sizes:
+            data = rng.randbytes(size)
+            digest = 'sha256:' + hashlib.sha256(data).hexdigest()
+            server.blobs[digest] = data
+            layers.append({'mediaType': 'application/vnd.ollama.image.model', 'digest': digest, 'size': size})
+        config = json.dumps({'model': model}).encode('utf-8')
+        config_digest = 'sha256:' + hashlib.sha256(config).hexdigest()
+        server.blobs[config_digest] = config
+        manifest = {'schemaVersion': 2, 'mediaType': manifest_media_type,
+                    'config': {'digest': config_digest, 'size': len(config)}, 'layers': layers}
+        name, _, tag = model.partition(':')
+        server.manifests[f"{name}:{tag}"] = json.dumps(manifest).encode('utf-8')
+    return server
+
+
+@contextlib.contextmanager
+def downloader_against(ollama_url, registry_url, models_dir):
+    """Point downloadModel at the fake servers and restore it afterwards."""
+    saved = (downloadModel.ollama_client, downloadModel.registry_downloader, downloadModel.telemetry, downloadModel.check_internet)
+    downloadModel.ollama_client = OllamaClient(ollama_url)
+    downloadModel.registry_downloader = RegistryDownloader(registry_url, models_dir, chunk_size=1024 * 1024)
+    downloadModel.telemetry = Telemetry()  # Keep benchmark runs out of the real metrics log
+    downloadModel.check_internet = lambda: True  # The fake servers are the whole internet here
+    try:
+        yield
+    finally:
+        (downloadModel.ollama_client, downloadModel.registry_downloader,
+         downloadModel.telemetry, downloadModel.check_internet) = saved
+
+
+def bench_downloads(args):
+    """Download synthetic models end to end through both backends and time them."""
+    models = [f"bench{i}:{random.Random(i).choice(size_tags)}" for i in range(args.models)]
+    model_size = args.layer_size * args.layers
+    ollama = fake_ollama(model_size, latency=args.latency, failure_rate=args.failure_rate)
+    registry = fake_registry(models, [args.layer_size] * args.layers, latency=args.latency, failure_rate=args.failure_rate)
+    results = {}
+    details = {}
+    try:
+        for backend in ('ollama', 'registry'):
+            timings = []
+            attempts = 0
+            for _ in range(args.repeat):
+                models_dir = tempfile.mkdtemp(prefix='ollama-benchmark-')
+                ollama.models_dir = models_dir
+                outcome = {}
+                try:
+                    with downloader_against(ollama.url(), registry.url(), models_dir):
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            started = time.perf_counter()
+                            downloadModel.download_models(
+                                models, args.concurrency, downloadModel.pull_backends[backend], results=outcome,
+                                max_attempts=args.max_attempts, interactive=False, show_progress=False,
+                                schedule=DownloadSchedule(backoff_base=0.01, backoff_max=0.05))
+                            timings.append(time.perf_counter() - started)
+                finally:
+                    shutil.rmtree(models_dir, ignore_errors=True)
+                failed = [model for model, result in outcome.items() if result['status'] != 'succeeded']
+                if failed:
+                    raise RuntimeError(f"{backend} benchmark run failed for {', '.join(failed)}")
+                attempts += sum(result['attempts'] for result in outcome.values())
+            name = f"download.{backend}[{args.models}x{model_size / 1e6:g}MB]"
+            results[name] = min(timings)
+            details[name] = f"{len(models) * model_size / min(timings) / 1e6:.1f} MB/s, {attempts / args.repeat:.1f} attempts per run"
+    finally:
+        for server in (ollama, registry):
+            server.shutdown()
+            server.server_close()
+    return results, details
+
+
+def load_baseline(path):
+    """Return the stored baseline, or None if there is none yet."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(path, results):
+    """Store the results as the new baseline, with what they were measured on."""
+    baseline = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'host': socket.gethostname(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+
+
+def report(results, details, baseline, tolerance):
+    """Print every result next to its baseline and return the names of the regressions."""
+    regressions = []
+    reference = baseline['results'] if baseline else {}
+    print(f"\n\033[1m{'benchmark':<34}{'time':>12}{'baseline':>12}{'change':>9}\033[0m")
+    for name, seconds in results.items():
+        line = f"{name:<34}{seconds * 1000:>10.2f}ms"
+        base = reference.get(name)
+        if base:
+            change = seconds / base - 1
+            color = '\033[91m' if change > tolerance else '\033[92m' if change < -tolerance else ''
+            line += f"{base * 1000:>10.2f}ms{color}{change:>+8.0%}\033[0m"
+            if change > tolerance:
+                regressions.append(name)
+                line += "  \033[91mREGRESSION\033[0m"
+        if name in details:
+            line += f"  \033[90m{details[name]}\033[0m"
+        print(line)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark catalog parsing, filtering, rendering and downloads against local fake servers.")
+    parser.add_argument('--sizes', default='100,1000,10000', help="catalog sizes in models (default: 100,1000,10000)")
+    parser.add_argument('--repeat', type=int, default=7, help="runs per benchmark, the fastest one counts (default: 7)")
+    parser.add_argument('--skip-downloads', action='store_true', help="only run the catalog benchmarks")
+    parser.add_argument('--models', type=int, default=4, help="models per download run (default: 4)")
+    parser.add_argument('--layers', type=int, default=2, help="layers per model (default: 2)")
+    parser.add_argument('--layer-size', type=parse_size, default=parse_size('4M'), metavar='SIZE', help="bytes per layer (default: 4M)")
+    parser.add_argument('--concurrency', type=int, default=2, help="models pulled at the same time (default: 2)")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds the fake servers wait before every response or progress line")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="share of pulls (Ollama) or blob transfers (registry) the fake servers fail, 0 to 1")
+    parser.add_argument('--max-attempts', type=int, default=20, help="attempts per model before a download run counts as failed (default: 20)")
+    parser.add_argument('--baseline', default=baseline_file, help="baseline file (default: benchmarkBaseline.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="slowdown against the baseline flagged as a regression (default: 0.25)")
+    parser.add_argument('--json', dest='json_output', help="also write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmarks, compare them with the baseline and return 1 if anything regressed."""
+    args = parse_args(argv)
+    results = {}
+    details = {}
+    for num_models in (int(size) for size in args.sizes.split(',') if size.strip()):
+        print(f"Catalog benchmarks with {num_models} models...")
+        results.update(bench_catalog(num_models, args.repeat))
+    if not args.skip_downloads:
+        print(f"Download benchmarks, {args.models} models, latency {args.latency}s, failure rate {args.failure_rate:.0%}...")
+        download_results, details = bench_downloads(args)
+        results.update(download_results)
+
+    baseline = load_baseline(args.baseline)
+    regressions = report(results, details, baseline, args.tolerance)
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'regressions': regressions}, f, indent=2)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"\nBaseline saved to {args.baseline}.")
+    elif baseline is None:
+        print("\nNo baseline yet, run with --save-baseline to store one.")
+    elif regressions:
+        print(f"\n\033[91m{len(regressions)} benchmark(s) more than {args.tolerance:.0%} slower than the baseline.\033[0m")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
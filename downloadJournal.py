@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import threading
+
+
+def empty_state():
+    """Return the queue state of a journal without any events."""
+    return {'settings': {}, 'pending': [], 'retry_count': {}, 'bytes': {}}
+
+
+def apply_event(state, event):
+    """Update a queue state with one journal event."""
+    kind = event.get('event')
+    model = event.get('model')
+    if kind == 'snapshot':
+        state.update(empty_state())
+        state['settings'] = event.get('settings', {})
+        state['pending'] = list(event.get('pending', []))
+        state['retry_count'] = dict(event.get('retry_count', {}))
+        state['bytes'] = {name: tuple(done) for name, done in event.get('bytes', {}).items()}
+    elif kind == 'created':
+        state.update(empty_state())
+        state['settings'] = event.get('settings', {})
+    elif kind == 'enqueued':
+        state['pending'].append(model)
+    elif kind == 'started':
+        state['retry_count'][model] = event.get('attempt', 1)
+    elif kind == 'progress':
+        state['bytes'][model] = (event.get('completed', 0), event.get('total', 0))
+    elif kind == 'succeeded':
+        if model in state['pending']:
+            state['pending'].remove(model)
+        state['retry_count'].pop(model, None)
+        state['bytes'].pop(model, None)
+    elif kind == 'abandoned':
+        if model in state['pending']:
+            state['pending'].remove(model)
+        state['retry_count'].pop(model, None)
+        state['bytes'].pop(model, None)
+    elif kind == 'requeued':
+        if model in state['pending']:
+            state['pending'].remove(model)
+            state['pending'].append(model)
+    # 'failed' only records the failed attempt, the queue order does not change
+
+
+class DownloadJournal:
+    """
+    Append-only, fsync'd record of a download queue, so the queue survives a crash, kill or reboot.
+    Every change is one JSON line; replaying the lines rebuilds the queue. The file is rewritten as a
+    single snapshot line every `compact_every` events to keep it small.
+    """
+
+    def __init__(self, path, compact_every=200, progress_interval=10):
+        self.path = path
+        self.compact_every = compact_every
+        self.progress_interval = progress_interval  # Seconds between two progress events of one model
+        self.lock = threading.Lock()
+        self.state = empty_state()
+        self.events_since_compaction = 0
+        self.last_progress = {}
+        self.file = None
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Replay an existing journal; a torn last line from a crash is ignored. The journal is then
+        rewritten as a snapshot, so the next event is not appended to the torn line and lost with it.
+        """
+        journal = cls(path, **kwargs)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except OSError:
+            return journal
+        damaged = bool(content) and not content.endswith('\n')
+        for line in content.splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                damaged = True
+                continue
+            apply_event(journal.state, event)
+            journal.events_since_compaction += 1
+        if damaged:
+            with journal.lock:
+                journal.write_snapshot()
+        return journal
+
+    def unfinished(self):
+        """Check whether the journal still has models waiting to be downloaded."""
+        return bool(self.state['pending'])
+
+    def start(self, models, settings):
+        """Begin a new queue, replacing whatever the journal held before."""
+        now = round(time.time(), 3)
+        events = [{'event': 'created', 'time': now, 'settings': dict(settings)}]
+        events += [{'event': 'enqueued', 'time': now, 'model': model} for model in models]
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.state = empty_state()
+            self.file = open(self.path, 'w', encoding='utf-8')
+            for event in events:
+                apply_event(self.state, event)
+                self.file.write(json.dumps(event) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.events_since_compaction = len(events)
+
+    def record(self, event, model=None, **fields):
+        """Append one event and apply it to the in-memory state."""
+        entry = {'event': event, 'time': round(time.time(), 3)}
+        if model is not None:
+            entry['model'] = model
+        entry.update(fields)
+        with self.lock:
+            if event == 'progress':
+                # Byte counts change constantly, only keep one every progress_interval seconds
+                now = time.monotonic()
+                if now - self.last_progress.get(model, 0) < self.progress_interval:
+                    apply_event(self.state, entry)
+                    return
+                self.last_progress[model] = now
+            apply_event(self.state, entry)
+            if self.events_since_compaction >= self.compact_every:
+                self.write_snapshot()
+                return
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.events_since_compaction += 1
+
+    def write_snapshot(self):
+        """Replace the journal with one snapshot line of the current state (lock held by the caller)."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        snapshot = {
+            'event': 'snapshot',
+            'time': round(time.time(), 3),
+            'settings': self.state['settings'],
+            'pending': self.state['pending'],
+            'retry_count': self.state['retry_count'],
+            'bytes': {model: list(done) for model, done in self.state['bytes'].items()},
+        }
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(snapshot) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+        self.events_since_compaction = 1
+
+    def discard(self):
+        """Remove the journal once its queue is done or abandoned."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.state = empty_state()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
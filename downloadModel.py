@@ -1,12 +1,36 @@
 import os
 import re
+import json
 import time
+import zlib
+import shutil
+import hashlib
+import tempfile
 import http.client
 import urllib.parse
-import subprocess
+import socket
+import argparse
+import threading
+import contextlib
+from datetime import datetime, timezone
+from bisect import bisect_left, bisect_right
 from math import ceil
 import sys
 
+from ollamaClient import OllamaClient, OllamaError
+from registryDownloader import RegistryDownloader, RegistryError, ManifestNotFound, manifest_layers
+from downloadJournal import DownloadJournal
+from downloadSchedule import DownloadSchedule, parse_rate, parse_window, parse_clock, next_clock_time
+from registryMirror import RegistryMirror, parse_size
+from downloadTelemetry import Telemetry
+from liveSearch import LiveSearch, live_search_supported, clear_screen, model_color_codes
+
+try:
+    # Optional, only used to accept brotli-compressed responses
+    import brotli
+except ImportError:
+    brotli = None
+
 
 # Determine the base directory
 if getattr(sys, 'frozen', False):
@@ -16,72 +40,124 @@ else:
     # If the application is running as a script
     current_dir = os.path.dirname(__file__)
 
+# Library page listing all models, newest first
+model_list_url = "https://ollama.com/library?sort=newest"
 # Define the local file to save the downloaded web page
 web_page_file = os.path.join(current_dir, "modelListPage.html")
+# Parsed form of web_page_file, reused while the HTML is unchanged
+catalog_cache_file = os.path.join(current_dir, "modelListPage.cache.json")
+# Bump whenever the parsed catalog layout changes so stale caches are ignored
+CATALOG_CACHE_VERSION = 1
+# Download sizes of catalog entries resolved from registry manifests
+model_sizes_file = os.path.join(current_dir, "modelSizes.cache.json")
+# Bump whenever the size cache layout changes so stale caches are ignored
+SIZE_CACHE_VERSION = 1
+# Seconds a cached size stays fresh before it is refreshed in the background
+SIZE_CACHE_TTL = 24 * 60 * 60
+# Journal of the current download queue, kept until every model in it is downloaded
+download_journal_file = os.path.join(current_dir, "downloadQueue.journal")
+# Space kept free on the disk of the Ollama model store, so the system keeps working when it fills up
+disk_reserve = 1024 ** 3
+# Blob cache of the registry mirror this machine can serve to others (--serve-mirror)
+mirror_dir = os.path.join(current_dir, "registryMirror")
+# Timings of catalog loads and downloads, one JSON object per line, to compare runs and hosts over time
+metrics_log_file = os.path.join(current_dir, "downloadMetrics.jsonl")
+
+# Client for the local Ollama server (honours OLLAMA_HOST)
+ollama_client = OllamaClient()
+# Built-in downloader writing straight into the Ollama model store (honours OLLAMA_MODELS)
+registry_downloader = RegistryDownloader()
+# Measurements of this process (the Prometheus outputs are set up from the command line)
+telemetry = Telemetry(metrics_log_file)
 
 
-def main():
+def main(enrich_sizes=True, schedule=None, live_search=True):
+    """Run interactive rounds of browsing and downloading until the user is done."""
+    while interactive_round(enrich_sizes, schedule, live_search):
+        pass
+
+def interactive_round(enrich_sizes=True, schedule=None, live_search=True):
+    """
+    Browse, select and download models once. Returns True if the user wants another round.
+    With enrich_sizes the download size of every listed model is looked up in the background.
+    The schedule (order, bandwidth cap, time windows, deadline) applies to every download.
+    With live_search the list is filtered as the user types, on terminals that support it.
+    """
     try:
         # Initialize variables
         parameters = {}
         descriptions = {}
 
+        # Offer to finish a queue an earlier run did not complete before showing any list
+        journal = DownloadJournal.load(download_journal_file)
+        if journal.unfinished() and offer_resume(journal):
+            settings = journal.state['settings']
+            if not run_downloads(journal.state['pending'], settings.get('concurrency', 1),
+                                 settings.get('backend', 'ollama'), settings.get('hibernate', False), journal, schedule):
+                return False
+            return ask_another()
+
         if os.path.exists(web_page_file):
             print("\033[33mLocal model list found. Loading local list...")
             try:
-                # First load the local model list
-                with open(web_page_file, 'r', encoding='utf-8') as f:
-                    html_content = f.read()
-                # Extract data from local file
-                models, parameters, descriptions = extract_model_data(html_content)
+                # First load the local model list (from the parsed cache when it is still valid)
+                models, parameters, descriptions = load_local_catalog()
             except Exception as e:
                 print(f"\033[91mError reading local model list: {e}\033[0m")
                 print("Downloading a fresh list...")
-                html_content = get_model_list()
-                models, parameters, descriptions = extract_model_data(html_content)
+                models, parameters, descriptions = get_model_list()
             else:
                 # Ask the user whether to load the local HTML or download a new one
                 choice = input("Press \033[95mEnter\033[33m to continue with your local list (default) or enter \033[95m'd'\033[33m to download a fresh list: ")
                 if choice.upper() == 'D':
-                    html_content = get_model_list()
-                    models, parameters, descriptions = extract_model_data(html_content)
+                    models, parameters, descriptions = get_model_list()
                 elif choice != '':
                     print("Invalid choice. Exiting.")
                     exit(1)
         else:
             print("No local model list found. Downloading a new list...")
-            html_content = get_model_list()
-            models, parameters, descriptions = extract_model_data(html_content)
+            models, parameters, descriptions = get_model_list()
 
         if not models:
             print("No models found in the HTML content.")
             exit(1)
 
         # Get list of local models
-        local_result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-        localmodels = []
-        if local_result.returncode == 0:
-            for line in local_result.stdout.splitlines():
-                if line.strip():  # Skip empty lines
-                    model_name = line.split()[0]  # First column contains model:tag
-                    localmodels.append(model_name)
+        try:
+            localmodels = set(ollama_client.list_models())
+        except (OSError, OllamaError, ValueError):
+            localmodels = set()
+
+        # Index the catalog once so every filter is answered from lookups instead of a rescan
+        catalog_index = build_catalog_index(models, parameters)
+        # Show cached download sizes right away and look up missing or stale ones in the background
+        sizes = start_size_enrichment(catalog_index['entries']) if enrich_sizes else None
+
+        # Filter as the user types when keys can be read one at a time, keeping the query between filter rounds
+        live_view = None
+        if live_search and live_search_supported():
+            live_view = LiveSearch(catalog_index, localmodels, lambda query: filter_catalog(catalog_index, query),
+                                   lambda entry: known_size_label(sizes, entry), help_message)
 
         # Clear the screen for better readability
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_screen()
 
         while True:
-            filter_keyword = input("Enter a \033[92mkeyword\033[0m to filter models (press \033[95mEnter\033[0m to show all, or \033[95m'?'\033[0m for help): ").strip()
+            if live_view is not None:
+                filter_keyword, model_params = live_view.run()
+            else:
+                filter_keyword = input("Enter a \033[92mkeyword\033[0m to filter models (press \033[95mEnter\033[0m to show all, or \033[95m'?'\033[0m for help): ").strip()
 
-            if filter_keyword.lower() == '?':
-                showHelp()
-                continue  # Prompt the user again after showing help
+                if filter_keyword.lower() == '?':
+                    showHelp()
+                    continue  # Prompt the user again after showing help
 
-            # Clear the screen for better readability
-            os.system('cls' if os.name == 'nt' else 'clear')
-            model_params = display_models(models, parameters, localmodels, descriptions, filter_keyword if filter_keyword else None)
+                # Clear the screen for better readability
+                clear_screen()
+                model_params = display_models(models, parameters, localmodels, descriptions, filter_keyword if filter_keyword else None, catalog_index, sizes)
 
-            if not model_params:
-                continue  # Prompt the user to enter a new filter keyword
+                if not model_params:
+                    continue  # Prompt the user to enter a new filter keyword
 
             print(f"\nTotal models found: {len(model_params)}")
 
@@ -92,92 +168,29 @@ def main():
                 while True:
                     action = confirm_models(selected_models, descriptions)
                     if action == 'confirm':
+                        plan = show_download_plan(selected_models)
+                        admission = admit_models(selected_models, plan)
+                        show_admission(admission)
+                        if admission['too_big']:
+                            choice = ask_admission(admission)
+                            if choice == 'cancel':
+                                continue  # Back to the confirmation of the selection
+                            if choice == 'fits':
+                                selected_models = admission['fits']
+                            else:
+                                # Pulled anyway, so the disk check must not defer them for the space they lack
+                                admission['needed'] = {model: needed for model, needed in admission['needed'].items()
+                                                       if model not in admission['too_big']}
                         hibernate_choice = input("Do you want to hibernate after the downloads? (Y/N, default: Y): ").strip().upper()
                         should_hibernate = hibernate_choice == '' or hibernate_choice != 'N'
 
-                        # Infinite loop to retry models
-                        retry_count = {}
-                        total_models = len(selected_models)
-
-                        def check_internet():
-                            """Check internet connectivity by trying to connect to ollama.com"""
-                            try:
-                                conn = http.client.HTTPSConnection("registry.ollama.ai", timeout=5)
-                                conn.request("HEAD", "/")
-                                return conn.getresponse().status == 200
-                            except:
-                                return False
-
-                        # Process models until the list is empty (resumes from the point of interruption)
-                        while selected_models:  # Keep going until all models are processed
-                            try:
-                                modelparam_selected = selected_models[0]  # Always work on the first model in the list
-                                current_model_index = total_models - len(selected_models) + 1
-                                exec_count = retry_count.get(modelparam_selected, 0) + 1
-                                retry_count[modelparam_selected] = exec_count
-
-                                print(f"Downloading \033[92m{modelparam_selected}\033[0m ({current_model_index}/{total_models}), Attempt: {exec_count}")
-                                result = subprocess.run(['ollama', 'pull', modelparam_selected])
-
-                                if result.returncode == 0:
-                                    print(f"\033[92m{modelparam_selected}\033[0m downloaded successfully in {exec_count} attempt(s).")
-
-                                    print("\nModel details:")
-                                    show_result = subprocess.run(['ollama', 'show', modelparam_selected], capture_output=True, text=True)
-                                    if show_result.returncode == 0:
-                                        print(f"\033[90m{show_result.stdout}\033[0m")
-                                    else:
-                                        print("Failed to show model details.")
-
-                                    selected_models.pop(0)  # Remove the successfully downloaded model
-                                    retry_count.pop(modelparam_selected, None)  # Clear retry count
-
-                                    if selected_models:
-                                        print(f"\nMoving to next model. {len(selected_models)} models remaining.")
-                                else:
-                                    print(f"\nDownload interrupted for {modelparam_selected}.")
-                                    if not check_internet():
-                                        print("Internet connection lost. Waiting for restoration...")
-                                        while not check_internet():
-                                            print("Waiting for internet connection...", end='\r')
-                                            time.sleep(5)
-                                        print("\nInternet connection restored. Retrying...")
-                                    else:
-                                        print("Failure not related to internet connection.")
-                                        if exec_count >= 3:
-                                            print(f"Moving {modelparam_selected} to end of queue after 3 failed attempts.")
-                                            selected_models.pop(0)  # Remove from front
-                                            selected_models.append(modelparam_selected)  # Add to end
-                                        time.sleep(5)  # Wait before retry
-                            except KeyboardInterrupt:
-                                resume_choice = input("\nDownload interrupted. Do you want to resume from the current position? (Y/N, default: Y): ").strip().upper()
-                                if resume_choice == '' or resume_choice == 'Y':
-                                    print("Resuming download...")
-                                    continue  # Continue with the same selected_models list
-                                else:
-                                    print("Exiting download process.")
-                                    return
-                        
-                        if should_hibernate:
-                            print("\nPress Ctrl+C to cancel hibernation...")
-                            try:
-                                for i in range(120, 0, -1):
-                                    print(f"\rHibernating in {i} seconds...", end='', flush=True)
-                                    time.sleep(1)
-                                print("\nHibernating now...")
-                                if os.name == 'nt':  # Windows
-                                    os.system('shutdown /h')
-                                else:  # Linux/Unix
-                                    os.system('systemctl hibernate')
-                            except KeyboardInterrupt:
-                                print("\nHibernate cancelled.")
-                        # Ask the user if they want to download another model
-                        another_choice = input("\nDo you want to download another model? (Y/N, default: Y): ").strip().upper()
-                        if another_choice == '' or another_choice == 'Y':
-                            main()  # Restart the main process to allow downloading another model
-                        else:
-                            print("Exiting the script. Goodbye!")
-                        return  # Exit after download
+                        concurrency = ask_concurrency()
+                        backend = ask_backend()
+
+                        journal.start(selected_models, {'concurrency': concurrency, 'backend': backend, 'hibernate': should_hibernate})
+                        if not run_downloads(selected_models, concurrency, backend, should_hibernate, journal, schedule, plan, admission):
+                            return False
+                        return ask_another()  # Exit after download
                     elif action == 'reselect':
                         selected_models = select_models(model_params)
                         if selected_models is None:
@@ -192,7 +205,712 @@ def main():
             print("Exiting the script. Goodbye!")
             sys.exit(0)
         else:
-            main()
+            return True  # Start over
+
+# Keep-alive connection reused by check_internet between probes, and the (scheme, host) it goes to
+internet_probe = {'conn': None, 'target': None}
+internet_probe_lock = threading.Lock()
+
+def check_internet():
+    """
+    Check connectivity by trying to connect to the registry, or to the registry mirror when the
+    downloads go through one: a machine behind a mirror may have no direct internet access.
+    """
+    if registry_downloader.mirror_url:
+        mirror = urllib.parse.urlsplit(registry_downloader.mirror_url)
+        target, path = (mirror.scheme, mirror.netloc), mirror.path.rstrip('/') + '/v2/'
+    else:
+        target, path = ('https', 'registry.ollama.ai'), '/'
+    with internet_probe_lock:
+        if internet_probe['target'] != target and internet_probe['conn'] is not None:
+            internet_probe['conn'].close()
+            internet_probe['conn'] = None
+        for attempt in (1, 2):
+            if internet_probe['conn'] is None:
+                connection_class = http.client.HTTPSConnection if target[0] == 'https' else http.client.HTTPConnection
+                internet_probe['conn'] = connection_class(target[1], timeout=5)
+                internet_probe['target'] = target
+            try:
+                conn = internet_probe['conn']
+                conn.request("HEAD", path)
+                response = conn.getresponse()
+                response.read()
+                return response.status == 200
+            except Exception:
+                # Drop the connection and probe once more on a fresh one in case it had gone stale
+                internet_probe['conn'].close()
+                internet_probe['conn'] = None
+        return False
+
+# Sizes shared by every round of this process: {model:tag: (bytes or None if the tag has no manifest, fetched at)}
+model_sizes = {}
+model_sizes_lock = threading.Lock()
+size_enrichment = {'thread': None}
+
+def load_size_cache():
+    """Load the cached download sizes into model_sizes."""
+    try:
+        with open(model_sizes_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return
+    if isinstance(cache, dict) and cache.get('version') == SIZE_CACHE_VERSION:
+        with model_sizes_lock:
+            for entry, (size, fetched_at) in cache.get('sizes', {}).items():
+                model_sizes.setdefault(entry, (size, fetched_at))
+
+def save_size_cache():
+    """Write model_sizes to the size cache file."""
+    with model_sizes_lock:
+        cache = {'version': SIZE_CACHE_VERSION, 'sizes': {entry: list(value) for entry, value in model_sizes.items()}}
+    temp_file = model_sizes_file + '.tmp'
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, separators=(',', ':'))
+        os.replace(temp_file, model_sizes_file)
+    except OSError:
+        pass  # Sizes are only informative, they are looked up again next time
+
+def start_size_enrichment(entries, max_workers=8, ttl=SIZE_CACHE_TTL):
+    """
+    Return model_sizes right away, loading the size cache on first use, and resolve the sizes of
+    entries that are missing or older than ttl from their registry manifests on a bounded pool of
+    background threads. Each thread reuses one keep-alive connection for its lookups.
+    """
+    if not model_sizes:
+        load_size_cache()
+    if size_enrichment['thread'] is not None and size_enrichment['thread'].is_alive():
+        return model_sizes
+    now = time.time()
+    stale = [entry for entry in dict.fromkeys(entries) if now - model_sizes.get(entry, (None, 0))[1] > ttl]
+    if not stale:
+        return model_sizes
+
+    def resolve_sizes():
+        """Look up queued entries until none are left."""
+        resolved = 0
+        while True:
+            with model_sizes_lock:
+                if not stale:
+                    break
+                entry = stale.pop(0)
+            try:
+                manifest, _ = registry_downloader.fetch_manifest(entry)
+                size = sum(layer['size'] for layer in manifest_layers(manifest))
+            except ManifestNotFound:
+                size = None  # The tag has no manifest, remember that until the entry expires
+            except (OSError, RegistryError, ValueError, KeyError, http.client.HTTPException):
+                continue  # Network or registry trouble, try again next time
+            with model_sizes_lock:
+                model_sizes[entry] = (size, time.time())
+            resolved += 1
+            if resolved % 50 == 0:
+                save_size_cache()
+        save_size_cache()
+
+    def run_pool():
+        workers = [threading.Thread(target=resolve_sizes, daemon=True) for _ in range(min(max_workers, len(stale)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    size_enrichment['thread'] = threading.Thread(target=run_pool, daemon=True)
+    size_enrichment['thread'].start()
+    return model_sizes
+
+def show_download_plan(selected_models):
+    """
+    Resolve the manifests of the selected models and show how much really has to be downloaded,
+    counting layers shared between the selected models once and skipping layers already stored locally.
+    Returns the plan from RegistryDownloader.plan, or None if the registry could not be reached.
+    """
+    print("\nResolving model manifests...")
+    plan = registry_downloader.plan(selected_models)
+    if not plan['models']:
+        print("\033[90mCould not resolve the selected models in the registry, download sizes are unknown.\033[0m")
+        return None
+
+    blob_users = {}
+    for info in plan['models'].values():
+        for digest in set(info['blobs']):
+            blob_users[digest] = blob_users.get(digest, 0) + 1
+
+    print("\n\033[1mDownload Plan:\033[0m")
+    for i, model in enumerate(selected_models, 1):
+        if model in plan['failed']:
+            print(f"{str(i).rjust(3)}. \033[92m{model}\033[0m \033[91msize unknown ({plan['failed'][model]})\033[0m")
+            continue
+        info = plan['models'][model]
+        shared = sum(1 for digest in set(info['blobs']) if blob_users[digest] > 1)
+        local = sum(1 for digest in set(info['blobs']) if digest in plan['local'])
+        notes = []
+        if shared:
+            notes.append(f"{shared} layer(s) shared with other selected models")
+        if local:
+            notes.append(f"{local} layer(s) already local")
+        note = f" \033[90m({', '.join(notes)})\033[0m" if notes else ""
+        print(f"{str(i).rjust(3)}. \033[92m{model}\033[0m {format_size(info['size'])}{note}")
+
+    print(f"\nUnique layers: {len(plan['blobs'])} ({len(plan['local'])} already local)")
+    print(f"To download: \033[93m{format_size(plan['transfer_bytes'])}\033[0m "
+          f"(selected models total {format_size(plan['total_bytes'])})\n")
+    return plan
+
+def models_disk_free():
+    """Return the free bytes on the disk of the Ollama model store, or None if it cannot be determined."""
+    try:
+        return shutil.disk_usage(registry_downloader.models_dir).free
+    except OSError:
+        return None
+
+def admit_models(selected_models, plan=None):
+    """
+    Work out which of the selected models fit on the disk of the Ollama model store, in queue order,
+    keeping disk_reserve bytes free. Sizes come from the download plan, or from the size cache for
+    models the plan could not resolve; layers already stored or needed by an earlier admitted model
+    are only counted once. Returns a dict with:
+      free     - free bytes on the disk, None if unknown (then every model is admitted)
+      fits     - models that fit, in queue order
+      too_big  - models that do not fit next to the ones before them
+      unknown  - admitted models whose size is not known
+      needed   - {model: bytes it adds to the disk}
+      total    - bytes the admitted models add to the disk
+    """
+    if not model_sizes:
+        load_size_cache()
+    free = models_disk_free()
+    admission = {'free': free, 'fits': [], 'too_big': [], 'unknown': [], 'needed': {}, 'total': 0}
+    counted = set(plan['local']) if plan else set()
+    for model in selected_models:
+        info = plan['models'].get(model) if plan else None
+        if info is not None:
+            new_blobs = {digest: plan['blobs'][digest] for digest in info['blobs'] if digest not in counted}
+            needed = sum(new_blobs.values())
+        else:
+            with model_sizes_lock:
+                needed = model_sizes.get(model, (None, 0))[0]
+            new_blobs = {}
+            if needed is None:
+                admission['unknown'].append(model)
+                admission['fits'].append(model)
+                continue
+        admission['needed'][model] = needed
+        if free is not None and admission['total'] + needed + disk_reserve > free:
+            admission['too_big'].append(model)
+            continue
+        counted.update(new_blobs)
+        admission['total'] += needed
+        admission['fits'].append(model)
+    return admission
+
+def show_admission(admission):
+    """Report whether the admitted models fit on the disk and which ones do not."""
+    if admission['free'] is None:
+        print("\033[90mFree disk space of the model store is unknown, it is not checked.\033[0m")
+        return
+    print(f"Free space in {registry_downloader.models_dir}: {format_size(admission['free'])} "
+          f"(keeping {format_size(disk_reserve)} free)")
+    if not admission['too_big']:
+        print(f"\033[92mAll selected models fit\033[0m, they need about {format_size(admission['total'])}.")
+    else:
+        print(f"\033[91mNot enough space for all selected models.\033[0m "
+              f"{len(admission['fits'])} model(s) fit in {format_size(admission['total'])}:")
+        for model in admission['fits']:
+            print(f"  \033[92m{model}\033[0m")
+        print("These do not fit:")
+        for model in admission['too_big']:
+            print(f"  \033[91m{model}\033[0m {format_size(admission['needed'][model])}")
+    if admission['unknown']:
+        print(f"\033[90mSize unknown, not counted: {', '.join(admission['unknown'])}\033[0m")
+
+def ask_admission(admission):
+    """Ask what to do when not all selected models fit on the disk: 'fits', 'all' or 'cancel'."""
+    while True:
+        if admission['fits']:
+            choice = input("Download only the models that \033[95mf\033[0mit (default), \033[95ma\033[0mll of them anyway, "
+                           "or \033[95mc\033[0mhange the selection? (F/A/C): ").strip().upper()
+            if choice == '' or choice == 'F':
+                return 'fits'
+        else:
+            choice = input("Download \033[95ma\033[0mll of them anyway, or \033[95mc\033[0mhange the selection (default)? (A/C): ").strip().upper()
+            if choice == '':
+                return 'cancel'
+        if choice == 'A':
+            return 'all'
+        if choice == 'C':
+            return 'cancel'
+        print("\033[91mInvalid input.\033[0m")
+
+def ask_concurrency():
+    """Ask how many models should be pulled at the same time."""
+    while True:
+        choice = input("How many models do you want to download at the same time? (default: 1): ").strip()
+        if choice == '':
+            return 1
+        if choice.isdigit() and int(choice) >= 1:
+            return int(choice)
+        print("\033[91mInvalid input. Please enter a number of 1 or more.\033[0m")
+
+def format_size(num_bytes):
+    """Format a byte count as a short human readable string like '4.7 GB'."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1000:
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{num_bytes} B"
+        num_bytes /= 1000
+    return f"{num_bytes:.1f} TB"
+
+def known_size_label(sizes, entry):
+    """Return the formatted download size of an entry from start_size_enrichment's dict, or None if not known yet."""
+    size = sizes.get(entry, (None, 0))[0] if sizes else None
+    return format_size(size) if size is not None else None
+
+def pull_with_api(model, on_progress=None, should_stop=None):
+    """Pull a model through the Ollama server and return True on success."""
+    try:
+        return ollama_client.pull(model, on_progress, should_stop)
+    except (OSError, OllamaError, ValueError, http.client.HTTPException) as e:
+        print(f"\r\033[K\033[91mPull failed for {model}: {e}\033[0m")
+        return False
+
+def pull_with_registry(model, on_progress=None, should_stop=None):
+    """
+    Pull a model with the built-in parallel downloader and return True on success.
+    The pull only counts once the Ollama server lists the model, as a model written to another
+    model store than the server's is invisible to it.
+    """
+    try:
+        if not registry_downloader.pull(model, on_progress, should_stop):
+            return False
+    except (OSError, RegistryError, ValueError, KeyError, http.client.HTTPException) as e:
+        print(f"\r\033[K\033[91mPull failed for {model}: {e}\033[0m")
+        return False
+    try:
+        listed = set(ollama_client.list_models())
+    except (OSError, OllamaError, ValueError, http.client.HTTPException):
+        return True  # Nothing to check against while the server is not running
+    if registry_downloader.listed_name(model) not in listed:
+        print(f"\r\033[K\033[91m{model} was written to {registry_downloader.models_dir}, but the Ollama server "
+              f"does not list it. Pass the model store the server uses with --models-dir.\033[0m")
+        return False
+    return True
+
+# Pull functions by the backend name stored with a queue
+pull_backends = {'ollama': pull_with_api, 'registry': pull_with_registry}
+
+def use_mirror(url):
+    """Fetch manifests and blobs through a caching registry mirror instead of the public registry."""
+    registry_downloader.mirror_url = (url if '://' in url else 'http://' + url).rstrip('/')
+
+def ask_backend():
+    """Ask which downloader should pull the models and return its name in pull_backends."""
+    if registry_downloader.mirror_url:
+        # The Ollama server pulls from the public registry itself, only the built-in downloader can use the mirror
+        print(f"Downloading through the registry mirror at \033[95m{registry_downloader.mirror_url}\033[0m.")
+        return 'registry'
+    while True:
+        choice = input("Download through the \033[95mO\033[0mllama server (default) or the \033[95mb\033[0muilt-in parallel downloader? (O/B): ").strip().upper()
+        if choice == '' or choice == 'O':
+            return 'ollama'
+        if choice == 'B':
+            return 'registry'
+        print("\033[91mInvalid input. Please enter O or B.\033[0m")
+
+def show_model_details(model):
+    """Return the details of a downloaded model, formatted like `ollama show`."""
+    try:
+        info = ollama_client.show(model)
+    except (OSError, OllamaError, ValueError, http.client.HTTPException):
+        return "Failed to show model details."
+    details = info.get('details', {})
+    model_info = info.get('model_info', {})
+    architecture = model_info.get('general.architecture', details.get('family', ''))
+    rows = [
+        ('architecture', architecture),
+        ('parameters', details.get('parameter_size')),
+        ('context length', model_info.get(f'{architecture}.context_length')),
+        ('embedding length', model_info.get(f'{architecture}.embedding_length')),
+        ('quantization', details.get('quantization_level')),
+    ]
+    lines = ["  Model"] + [f"    {name:<20}{value}" for name, value in rows if value]
+    return "\033[90m" + "\n".join(lines) + "\033[0m"
+
+def download_models(selected_models, concurrency=1, pull=pull_with_api, journal=None, results=None,
+                    max_attempts=None, interactive=True, show_progress=True, schedule=None, sizes=None, disk_needs=None):
+    """
+    Download the selected models with up to `concurrency` pulls running at the same time.
+    Every model keeps its own attempt count and is moved to the end of the queue after 3
+    failed attempts. With a concurrency of 1 the models are pulled one by one with a progress
+    line of their own; otherwise an aggregated progress line is shown.
+    Every change of the queue is recorded in the journal, if one is given, and a resumed
+    journal carries over its attempt counts.
+    If a results dict is given it is filled with the status, attempts, bytes and duration of
+    every model. A model that fails max_attempts times is given up instead of requeued.
+    Without interactive Ctrl+C stops the downloads instead of asking whether to resume.
+    The schedule decides the queue order (by the estimated sizes), pauses pulls outside its
+    time windows or above its bandwidth cap, spaces out retries and defers models that would
+    not finish before its deadline. disk_needs ({model: bytes it adds to the disk}) lets the
+    schedule hold a model back until the disk has room for it and the pulls already running;
+    a model that does not fit even on its own is deferred instead.
+    Returns False if the user stopped the downloads, True once the queue is empty.
+    """
+    if schedule is None:
+        schedule = DownloadSchedule()
+    sizes = sizes or {}
+    disk_needs = disk_needs or {}
+    pending = schedule.order_queue(selected_models, sizes)  # Models still to download, in queue order
+    active = set()  # Models a worker is currently pulling
+    retry_count = dict(journal.state['retry_count']) if journal is not None else {}
+    progress = {}
+    total_models = len(pending)
+    lock = threading.Lock()
+    running = threading.Event()  # Cleared while the user decides whether to resume after Ctrl+C
+    running.set()
+    state = {'stopped': False, 'error': None, 'paused': None}
+    transferred = {'bytes': 0, 'since': time.monotonic()}  # Measured throughput for the deadline estimates
+    concurrent = concurrency > 1
+    threads = []
+    if results is None:
+        results = {}
+    for model in pending:
+        results[model] = {'status': 'pending', 'attempts': retry_count.get(model, 0), 'bytes': 0, 'duration': 0.0}
+
+    def record(event, model, **fields):
+        """Record a queue event in the journal, if there is one."""
+        if journal is not None:
+            journal.record(event, model, **fields)
+
+    def say(message, end='\n'):
+        """Print a message, clearing the aggregated progress line first when it is shown."""
+        with lock:
+            print(('\r\033[K' if concurrent and show_progress else '') + message, end=end, flush=True)
+
+    def next_model():
+        """Reserve the first queued model no other worker is pulling."""
+        with lock:
+            for model in pending:
+                if model not in active:
+                    active.add(model)
+                    return model
+        return None
+
+    def stopped():
+        """Check whether the user stopped or paused the downloads."""
+        return not running.is_set() or state['stopped']
+
+    def space_needed(model, alone=False):
+        """Return the bytes this model and, unless alone, the other running pulls still have to write to the disk."""
+        with lock:
+            models = {model} if alone else active | {model}
+            return sum(max(0, disk_needs.get(other, 0) - results[other]['bytes']) for other in models)
+
+    def wait_until_allowed(model):
+        """
+        Wait while the schedule pauses pulls. A model that does not fit on the disk even on its own is
+        deferred instead, so it does not hold up the queue behind it.
+        Returns False if the model was deferred or the user stopped the downloads meanwhile.
+        """
+        while not stopped():
+            needed = space_needed(model)
+            reason = schedule.pause_reason(needed)
+            if reason is None:
+                state['paused'] = None
+                return True
+            if schedule.in_window() and schedule.low_on_disk(space_needed(model, alone=True)):
+                defer(model, f"{format_size(disk_needs[model] - results[model]['bytes'])} does not fit on the disk")
+                return False
+            with lock:
+                first = state['paused'] != reason
+                state['paused'] = reason
+            if first:
+                say(f"\033[33mDownloads paused: {reason}.\033[0m")
+            # Sleep until the schedule allows pulls again, so a capped pull does not restart for every refill
+            resume_at = time.monotonic() + max(0.1, schedule.seconds_until_allowed(needed))
+            while not stopped() and time.monotonic() < resume_at:
+                time.sleep(min(1.0, resume_at - time.monotonic()))
+        return False
+
+    def defer(model, reason):
+        """Take a model out of this run without finishing it; it stays in the journal for a later run."""
+        say(f"\033[33mDeferring {model}: {reason}.\033[0m")
+        with lock:
+            pending.remove(model)
+            progress.pop(model, None)
+        results[model]['status'] = 'deferred'
+        telemetry.model_finished(model, 'deferred')
+
+    def download(model):
+        """Pull one model until it succeeds or gives up its place in the queue."""
+        while running.is_set() and not state['stopped']:
+            if not wait_until_allowed(model):
+                return
+            if schedule.past_deadline():
+                defer(model, "the deadline has passed")
+                return
+            elapsed = time.monotonic() - transferred['since']
+            throughput = transferred['bytes'] / elapsed if transferred['bytes'] and elapsed > 0 else None
+            if schedule.misses_deadline(sizes.get(model), throughput):
+                defer(model, f"{format_size(sizes[model])} would not finish before the deadline")
+                return
+            with lock:
+                exec_count = retry_count.get(model, 0) + 1
+                retry_count[model] = exec_count
+                current_model_index = total_models - len(pending) + sum(1 for other in active if other in pending)
+                progress[model] = (0, 0)
+            record('started', model, attempt=exec_count)
+            telemetry.attempt_started(model, exec_count)
+            results[model]['attempts'] = exec_count
+            attempt_started = time.monotonic()
+            say(f"Downloading \033[92m{model}\033[0m ({current_model_index}/{total_models}), Attempt: {exec_count}")
+
+            def on_progress(completed, total, status, new_bytes):
+                if new_bytes > 0:
+                    schedule.book_progress(new_bytes)
+                    telemetry.model_bytes(model, new_bytes)
+                    with lock:
+                        transferred['bytes'] += new_bytes
+                progress[model] = (completed, total)
+                results[model]['bytes'] = completed
+                record('progress', model, completed=completed, total=total)
+                if show_progress and not concurrent:
+                    if total:
+                        status = f"{status} {completed * 100 // total}% {format_size(completed)}/{format_size(total)}"
+                    print(f"\r\033[K{status}", end='', flush=True)
+
+            success = pull(model, on_progress, lambda: stopped() or schedule.pause_reason() is not None)
+            attempt_duration = time.monotonic() - attempt_started
+            results[model]['duration'] += attempt_duration
+            if show_progress and not concurrent:
+                print()
+
+            if success:
+                record('succeeded', model, attempt=exec_count)
+                telemetry.attempt_finished(model, exec_count, 'succeeded', attempt_duration)
+                telemetry.model_finished(model, 'succeeded')
+                results[model]['status'] = 'succeeded'
+                details = show_model_details(model)
+                with lock:
+                    pending.remove(model)  # Remove the successfully downloaded model
+                    retry_count.pop(model, None)  # Clear retry count
+                    progress.pop(model, None)
+                    remaining = len(pending)
+                say(f"\033[92m{model}\033[0m downloaded successfully in {exec_count} attempt(s).")
+                say(f"\nModel details:\n{details}")
+                if remaining:
+                    say(f"\nMoving to next model. {remaining} models remaining.")
+                return
+
+            record('failed', model, attempt=exec_count)
+            if stopped():
+                telemetry.attempt_finished(model, exec_count, 'stopped', attempt_duration)
+                return  # Interrupted by the user, the model keeps its place in the queue
+            if schedule.pause_reason() is not None:
+                # Paused by the schedule, which does not count as a failed attempt
+                telemetry.attempt_finished(model, exec_count, 'paused', attempt_duration)
+                with lock:
+                    retry_count[model] = exec_count - 1
+                results[model]['attempts'] = exec_count - 1
+                continue
+            telemetry.attempt_finished(model, exec_count, 'failed', attempt_duration)
+            say(f"\nDownload interrupted for {model}.")
+            wait_started = time.monotonic()
+            if not check_internet():
+                say("Internet connection lost. Waiting for restoration...")
+                while not check_internet():
+                    say("Waiting for internet connection...", end='\r')
+                    time.sleep(5)
+                telemetry.internet_wait(model, time.monotonic() - wait_started)
+                say("\nInternet connection restored. Retrying...")
+            else:
+                telemetry.internet_wait(model, time.monotonic() - wait_started)
+                say("Failure not related to internet connection.")
+                if max_attempts is not None and exec_count >= max_attempts:
+                    say(f"\033[91mGiving up on {model} after {exec_count} failed attempts.\033[0m")
+                    with lock:
+                        pending.remove(model)
+                        retry_count.pop(model, None)
+                    record('abandoned', model, attempt=exec_count)
+                    telemetry.model_finished(model, 'failed')
+                    results[model]['status'] = 'failed'
+                    return
+                if exec_count >= 3:
+                    say(f"Moving {model} to end of queue after 3 failed attempts.")
+                    with lock:
+                        pending.remove(model)  # Remove from its position
+                        pending.append(model)  # Add to end
+                    record('requeued', model)
+                    time.sleep(schedule.backoff_delay(1))  # Wait before retry
+                    return
+                time.sleep(schedule.backoff_delay(exec_count))  # Wait before retry
+
+    def worker():
+        """Keep pulling queued models until the queue is empty or the downloads are stopped."""
+        while True:
+            running.wait()
+            if state['stopped']:
+                return
+            model = next_model()
+            if model is None:
+                return
+            try:
+                download(model)
+            except Exception as e:
+                # Surface unexpected errors in the main thread instead of losing them with the worker
+                state['error'] = e
+                state['stopped'] = True
+                return
+            finally:
+                with lock:
+                    active.discard(model)
+                    progress.pop(model, None)
+
+    # Process models until the queue is empty (resumes from the point of interruption)
+    while True:
+        try:
+            if not concurrent:
+                worker()
+            else:
+                # Workers paused by an earlier Ctrl+C carry on, only missing ones are started
+                threads = [thread for thread in threads if thread.is_alive()]
+                while len(threads) < concurrency:
+                    thread = threading.Thread(target=worker, daemon=True)
+                    thread.start()
+                    threads.append(thread)
+                while True:
+                    alive = [thread for thread in threads if thread.is_alive()]
+                    if not alive:
+                        break
+                    if show_progress:
+                        with lock:
+                            done = total_models - len(pending)
+                            status = " | ".join(
+                                f"{model} {completed * 100 // total if total else 0}%"
+                                for model, (completed, total) in progress.items()
+                            )
+                            print(f"\r\033[K[{done}/{total_models} done] {status}", end='', flush=True)
+                    # Wait on a running worker rather than sleeping, so the last one finishing ends the wait at once
+                    alive[0].join(0.5)
+                if show_progress:
+                    print('\r\033[K', end='')
+                if state['error'] is not None:
+                    raise state['error']
+            if not pending:
+                return True
+        except KeyboardInterrupt:
+            running.clear()
+            if not interactive:
+                print("\nDownload interrupted. Stopping.")
+                state['stopped'] = True
+                running.set()
+                return False
+            resume_choice = input("\nDownload interrupted. Do you want to resume from the current position? (Y/N, default: Y): ").strip().upper()
+            if resume_choice == '' or resume_choice == 'Y':
+                print("Resuming download...")
+                running.set()
+                continue  # Continue with the same queue
+            state['stopped'] = True
+            running.set()
+            return False
+
+def offer_resume(journal):
+    """Show the unfinished queue of an earlier run and ask whether to resume it. Discards it otherwise."""
+    print("\033[33mAn unfinished download queue from an earlier run was found:\033[0m")
+    for i, model in enumerate(journal.state['pending'], 1):
+        notes = []
+        completed, total = journal.state['bytes'].get(model, (0, 0))
+        if total:
+            notes.append(f"{format_size(completed)} of {format_size(total)} done")
+        attempts = journal.state['retry_count'].get(model)
+        if attempts:
+            notes.append(f"{attempts} attempt(s)")
+        note = f" \033[90m({', '.join(notes)})\033[0m" if notes else ""
+        print(f"{str(i).rjust(3)}. \033[92m{model}\033[0m{note}")
+    choice = input("Do you want to resume this queue? (Y/N, default: Y): ").strip().upper()
+    if choice == '' or choice == 'Y':
+        return True
+    journal.discard()
+    return False
+
+def estimate_model_sizes(models, plan=None):
+    """
+    Return the download size of each model in bytes (None if unknown), taken from a download plan,
+    the size cache, or the registry manifests of the models neither of them knows.
+    """
+    sizes = {model: info['size'] for model, info in plan['models'].items()} if plan else {}
+    if not model_sizes:
+        load_size_cache()
+    with model_sizes_lock:
+        for model in models:
+            if sizes.get(model) is None and model_sizes.get(model, (None, 0))[0] is not None:
+                sizes[model] = model_sizes[model][0]
+    missing = [model for model in models if sizes.get(model) is None]
+    if missing and plan is None:
+        sizes.update({model: info['size'] for model, info in registry_downloader.plan(missing)['models'].items()})
+    return sizes
+
+def use_schedule(schedule, backend):
+    """Let the built-in downloader throttle itself to the bandwidth cap; Ollama pulls are paused and resumed instead."""
+    registry_downloader.rate_limiter = schedule.rate_limiter if backend == 'registry' else None
+    schedule.count_progress = backend != 'registry'
+
+def run_downloads(selected_models, concurrency, backend, should_hibernate, journal=None, schedule=None, plan=None,
+                  admission=None):
+    """
+    Download the queue following the schedule and hibernate afterwards if requested.
+    Models deferred by the deadline or for lack of disk space stay in the journal for the next run.
+    Without an admission (a resumed queue) the disk space is checked here, and the models that do
+    not fit are left for the next run like run_batch leaves them out.
+    Returns False if the user stopped the downloads.
+    """
+    schedule = schedule or DownloadSchedule()
+    if registry_downloader.mirror_url:
+        backend = 'registry'  # Also for a resumed queue that was started without the mirror
+    use_schedule(schedule, backend)
+    too_big = []
+    if admission is None:
+        if plan is None:
+            plan = registry_downloader.plan(selected_models)
+        admission = admit_models(selected_models, plan)
+        show_admission(admission)
+        too_big = admission['too_big']
+        selected_models = admission['fits']
+    sizes = estimate_model_sizes(selected_models, plan) if schedule.order == 'smallest' or schedule.deadline else None
+    results = {}
+    if not download_models(selected_models, concurrency, pull_backends[backend], journal, results,
+                           schedule=schedule, sizes=sizes, disk_needs=admission['needed']):
+        print("Exiting download process.")
+        return False
+    deferred = [model for model, result in results.items() if result['status'] == 'deferred'] + too_big
+    if deferred:
+        print(f"\033[33m{len(deferred)} model(s) deferred to the next run: {', '.join(deferred)}\033[0m")
+    elif journal is not None:
+        journal.discard()
+    if should_hibernate:
+        hibernate()
+    return True
+
+def hibernate():
+    """Hibernate the machine after a countdown that Ctrl+C cancels."""
+    print("\nPress Ctrl+C to cancel hibernation...")
+    try:
+        for i in range(120, 0, -1):
+            print(f"\rHibernating in {i} seconds...", end='', flush=True)
+            time.sleep(1)
+        print("\nHibernating now...")
+        if os.name == 'nt':  # Windows
+            os.system('shutdown /h')
+        else:  # Linux/Unix
+            os.system('systemctl hibernate')
+    except KeyboardInterrupt:
+        print("\nHibernate cancelled.")
+
+def ask_another():
+    """Ask the user if they want to download another model. Returns True to start over."""
+    another_choice = input("\nDo you want to download another model? (Y/N, default: Y): ").strip().upper()
+    if another_choice == '' or another_choice == 'Y':
+        return True  # Start over to allow downloading another model
+    print("Exiting the script. Goodbye!")
+    return False
 
 def select_models(model_params):
     """Prompt user to select models by index from model_params."""
@@ -222,7 +940,7 @@ def select_models(model_params):
 def confirm_models(selected_models, descriptions):
     """Show selected models and ask for confirmation or reselection."""
     while True:
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_screen()
         print("\n\033[1mConfirm Selected Models:\033[0m")
         for i, model in enumerate(selected_models, 1):
             base_model = model.split(':')[0]
@@ -244,156 +962,409 @@ def confirm_models(selected_models, descriptions):
             print("\n\033[91mInvalid input. Please enter Y, N, or F.\033[0m")
             time.sleep(1)
 
-def extract_model_data(html_content):
-    """Extract models, parameters and descriptions from HTML content"""
-    models = extract_models(html_content)
+# Tokens of the library page we care about, matched in a single left-to-right scan
+catalog_token_regex = re.compile(
+    r'(?P<li><li[^>]*x-test-model[^>]*>)'
+    r'|(?P<end></li>)'
+    r'|<div x-test-model-title title="(?P<title>[^"]+)"'
+    r'|<span[^>]*x-test-size[^>]*>(?P<size>[^<]+)</span>'
+    r'|<p class="max-w-lg[^"]*break-words text-neutral-800[^"]*">(?P<desc>.*?)</p>',
+    re.DOTALL
+)
+
+def parse_catalog(html):
+    """
+    Walk the library page once and return (models, parameters, descriptions).
+    Produces the same result as the per-model regex lookups it replaced (kept in test_catalog.py).
+    """
+    models = []
     parameters = {}
     descriptions = {}
-    if models:
-        for model in models:
-            parameters[model] = extract_parameters(html_content, model)
-            descriptions[model] = extract_description(html_content, model)
+    block_title = None
+    block_sizes = []
+    block_desc = None
+    in_block = False
+
+    def close_block():
+        # Like the regex lookup, the first block carrying a given title wins
+        if block_title is not None and block_title not in parameters:
+            parameters[block_title] = ",".join(block_sizes) if block_sizes else "latest"
+            descriptions[block_title] = block_desc if block_desc is not None else "No description available"
+
+    for token in catalog_token_regex.finditer(html):
+        kind = token.lastgroup
+        if kind == 'li':
+            close_block()
+            block_title, block_sizes, block_desc, in_block = None, [], None, True
+        elif kind == 'title':
+            models.append(token.group('title'))
+            if in_block and block_title is None:
+                block_title = token.group('title')
+        elif kind == 'end':
+            # A model block ends at the first </li> following its title
+            if block_title is not None:
+                close_block()
+                block_title, block_sizes, block_desc, in_block = None, [], None, False
+        elif not in_block:
+            continue
+        elif kind == 'size':
+            block_sizes.append(token.group('size').lower().strip())
+        elif kind == 'desc' and block_desc is None:
+            description = re.sub(r'<[^>]+>', '', token.group('desc'))
+            block_desc = ' '.join(description.split())
+    close_block()
+
+    # Titles found outside any model block get the same defaults as the regex helpers
+    for model in models:
+        parameters.setdefault(model, "latest")
+        descriptions.setdefault(model, "No description available")
     return models, parameters, descriptions
 
-def extract_models(html):
-    """Extract models from HTML content"""
-    model_regex = r'<div x-test-model-title title="([^"]+)"'
-    matches = re.findall(model_regex, html)
-    return matches
-
-def extract_description(html, model):
-    """Extract description for a specific model"""
-    escaped_model = re.escape(model)
-    # Find the specific <li> element containing this model
-    pattern = f'<li[^>]*x-test-model[^>]*>(?:(?!<li[^>]*x-test-model[^>]*>).)*?<div[^>]*title="{escaped_model}".*?</li>'
-    model_block = re.search(pattern, html, re.DOTALL)
-    
-    if model_block:
-        # Look for the description paragraph with specific classes that follows the title
-        desc_regex = r'<p class="max-w-lg[^"]*break-words text-neutral-800[^"]*">(.*?)</p>'
-        desc_match = re.search(desc_regex, model_block.group(), re.DOTALL)
-        if desc_match:
-            description = desc_match.group(1)
-            # Remove HTML tags if any remain
-            description = re.sub(r'<[^>]+>', '', description)
-            # Clean up whitespace
-            description = ' '.join(description.split())
-            return description
-    return "No description available"
-
-def extract_parameters(html, model):
-    """Extract parameters related to each model"""
-    escaped_model = re.escape(model)
-    # Find the specific <li> element containing this model
-    pattern = f'<li[^>]*x-test-model[^>]*>(?:(?!<li[^>]*x-test-model[^>]*>).)*?<div[^>]*title="{escaped_model}".*?</li>'
-    model_block = re.search(pattern, html, re.DOTALL)
-    
-    if model_block:
-        # Only search for parameters within this model's block
-        param_regex = r'<span[^>]*x-test-size[^>]*>([^<]+)</span>'
-        param_matches = re.findall(param_regex, model_block.group())
-        
-        params = [match.lower().strip() for match in param_matches]
-        if params:
-            return ",".join(params)
-    return "latest"
+def extract_model_data(html_content):
+    """Extract models, parameters and descriptions from HTML content"""
+    models, parameters, descriptions = parse_catalog(html_content)
+    return models, parameters, descriptions
+
+def html_fingerprint(stat_result):
+    """Return the (mtime, size) pair a catalog cache is keyed on."""
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+def read_catalog_cache_entry():
+    """
+    Return the stored cache entry if it still matches web_page_file, otherwise None.
+    A matching mtime and size is trusted as is; otherwise the HTML hash decides.
+    """
+    try:
+        with open(catalog_cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        html_stat = os.stat(web_page_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != CATALOG_CACHE_VERSION:
+        return None
+
+    mtime, size = html_fingerprint(html_stat)
+    if cache.get('size') != size:
+        return None
+    if cache.get('mtime') == mtime:
+        return cache
+
+    # The file was touched but may be unchanged, compare contents before giving up on the cache
+    with open(web_page_file, 'rb') as f:
+        html_bytes = f.read()
+    if hashlib.sha256(html_bytes).hexdigest() != cache.get('sha256'):
+        return None
+    catalog = (cache['models'], cache['parameters'], cache['descriptions'])
+    return write_catalog_cache(cache['sha256'], catalog, cache.get('etag'), cache.get('last_modified'))
+
+def read_catalog_cache():
+    """Return the cached (models, parameters, descriptions) if it still matches web_page_file, otherwise None."""
+    cache = read_catalog_cache_entry()
+    if cache is None:
+        return None
+    return cache['models'], cache['parameters'], cache['descriptions']
+
+def write_catalog_cache(html_sha256, catalog, etag=None, last_modified=None):
+    """
+    Store the parsed catalog of web_page_file, keyed on its mtime, size and hash, and return the entry.
+    etag and last_modified are the server validators used for the next conditional refresh.
+    """
+    models, parameters, descriptions = catalog
+    mtime, size = html_fingerprint(os.stat(web_page_file))
+    cache = {
+        'version': CATALOG_CACHE_VERSION,
+        'mtime': mtime,
+        'size': size,
+        'sha256': html_sha256,
+        'etag': etag,
+        'last_modified': last_modified,
+        'models': models,
+        'parameters': parameters,
+        'descriptions': descriptions,
+    }
+    temp_file = catalog_cache_file + '.tmp'
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, separators=(',', ':'))
+        os.replace(temp_file, catalog_cache_file)
+    except OSError as e:
+        # The cache is only an accelerator, a failed write must not stop the program
+        print(f"\033[90mCould not write catalog cache: {e}\033[0m")
+    return cache
+
+def load_local_catalog():
+    """Load the local model list, from the parsed cache when valid or by parsing web_page_file."""
+    with telemetry.timed('catalog_cache_load') as fields:
+        catalog = read_catalog_cache()
+        fields['hit'] = catalog is not None
+    if catalog is not None:
+        return catalog
+    with open(web_page_file, 'rb') as f:
+        html_bytes = f.read()
+    with telemetry.timed('catalog_parse', bytes=len(html_bytes)) as fields:
+        catalog = extract_model_data(html_bytes.decode('utf-8'))
+        fields['models'] = len(catalog[0])
+    write_catalog_cache(hashlib.sha256(html_bytes).hexdigest(), catalog)
+    return catalog
+
+def http_connection(parsed_url, timeout=None):
+    """Open an HTTP or HTTPS connection matching the scheme of a parsed URL."""
+    if parsed_url.scheme == 'http':
+        return http.client.HTTPConnection(parsed_url.netloc, timeout=timeout)
+    return http.client.HTTPSConnection(parsed_url.netloc, timeout=timeout)
+
+def response_decompressor(content_encoding):
+    """Return a function that decompresses successive body chunks for the given Content-Encoding."""
+    content_encoding = (content_encoding or 'identity').strip().lower()
+    if content_encoding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+    if content_encoding == 'deflate':
+        return zlib.decompressobj().decompress
+    if content_encoding == 'br' and brotli is not None:
+        return brotli.Decompressor().process
+    if content_encoding == 'identity':
+        return lambda chunk: chunk
+    raise Exception(f"Unsupported content encoding: {content_encoding}")
+
+def stream_response_to_file(response, file_path, chunk_size=64 * 1024):
+    """
+    Decompress a response body as it arrives into a temporary file, then move it over file_path.
+    Returns the SHA-256 of the decompressed content.
+    """
+    decompress = response_decompressor(response.getheader('Content-Encoding'))
+    expected = response.getheader('Content-Length')
+    received = 0
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_file = tempfile.mkstemp(prefix=os.path.basename(file_path) + '.', suffix='.part', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                received += len(chunk)
+                data = decompress(chunk)
+                digest.update(data)
+                f.write(data)
+            # read(amt) returns b'' instead of raising when the server closes the connection early
+            if expected is not None and expected.isdigit() and received < int(expected):
+                raise http.client.IncompleteRead(b'', int(expected) - received)
+            f.flush()
+            os.fsync(f.fileno())
+        # Only a complete body ever replaces the existing file
+        os.replace(temp_file, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+        raise
+    return digest.hexdigest()
 
 def get_model_list():
-    """Fetch the model list from the website"""
-    url = "https://ollama.com/library?sort=newest"
+    """
+    Fetch the model list from the website and return (models, parameters, descriptions).
+    The request is conditional on the local copy, so an unchanged list costs a single 304 round trip.
+    """
+    url = model_list_url
     print(f"Fetching model list from {url}...")
     try:
         parsed_url = urllib.parse.urlparse(url)
-        conn = http.client.HTTPSConnection(parsed_url.netloc)
-        conn.request("GET", parsed_url.path + "?" + parsed_url.query)
-        response = conn.getresponse()
-        if response.status != 200:
-            raise Exception(f"HTTP error: {response.status} {response.reason}")
-        html_content = response.read().decode('utf-8')
-        conn.close()
-        
-        # Save the entire web page to a local file, overwriting if it exists
-        with open(web_page_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        headers = {'Accept-Encoding': 'br, gzip' if brotli is not None else 'gzip'}
+        cache = read_catalog_cache_entry() if os.path.exists(web_page_file) else None
+        if cache is not None:
+            if cache.get('etag'):
+                headers['If-None-Match'] = cache['etag']
+            if cache.get('last_modified'):
+                headers['If-Modified-Since'] = cache['last_modified']
+
+        conn = http_connection(parsed_url)
+        try:
+            with telemetry.timed('catalog_fetch', url=url) as fields:
+                conn.request("GET", parsed_url.path + "?" + parsed_url.query, headers=headers)
+                response = conn.getresponse()
+                fields['status'] = response.status
+                fields['encoding'] = response.getheader('Content-Encoding', 'identity')
+                if response.status == 304 and cache is not None:
+                    response.read()
+                    print("Model list unchanged since the last download. Using the local copy.")
+                    return cache['models'], cache['parameters'], cache['descriptions']
+                if response.status != 200:
+                    raise Exception(f"HTTP error: {response.status} {response.reason}")
+                # Save the entire web page to a local file, replacing it only once fully received
+                html_sha256 = stream_response_to_file(response, web_page_file)
+                fields['bytes'] = os.path.getsize(web_page_file)
+            etag = response.getheader('ETag')
+            last_modified = response.getheader('Last-Modified')
+        finally:
+            conn.close()
         print(f"Web page saved to {web_page_file}.")
-        
-        return html_content
+
+        # Store the parsed catalog so the next start does not have to parse the page again
+        with open(web_page_file, 'r', encoding='utf-8') as f:
+            html = f.read()
+        with telemetry.timed('catalog_parse', bytes=len(html)) as fields:
+            catalog = extract_model_data(html)
+            fields['models'] = len(catalog[0])
+        write_catalog_cache(html_sha256, catalog, etag, last_modified)
+        return catalog
     except Exception as e:
         print(f"Failed to fetch model list: {e}")
         exit(1)
 
 
-def display_models(models, parameters, localmodels, descriptions, filter_keyword=None):
+# A size comparison term such as '>=8b', '<700m' or '=1.5b'
+size_filter_regex = re.compile(r'(>=|<=|==|[<>=])(\d+(?:\.\d+)?[kmgb])$')
+# Longest n-gram kept in the keyword index, longer keywords intersect their n-grams
+NGRAM_LENGTH = 3
+
+def parse_param(param):
+    """Convert parameter string like '8b', '700k', '10.5m' to a float for comparison."""
+    match = re.match(r'(\d+(\.\d+)?)([kmgb])', param.lower())
+    if not match:
+        return None
+    num, _, unit = match.groups()
+    multiplier = {'k': 1_000, 'm': 1_000_000, 'b': 1_000_000_000, 'g': 1_000_000_000}[unit]
+    return float(num) * multiplier
+
+def build_catalog_index(models, parameters):
+    """
+    Build the lookup structures display_models filters with, once per catalog load.
+    Every model:parameter entry gets a position; sizes are kept sorted for bisection and
+    every 1 to NGRAM_LENGTH character n-gram of an entry maps to the positions containing it.
+    """
+    entries = []
+    entry_models = []
+    for model in models:
+        for param in parameters[model].split(','):
+            entries.append(f"{model}:{param.strip()}")
+            entry_models.append(model)
+
+    sized = sorted(
+        (size, position)
+        for position, size in enumerate(parse_param(entry.split(':', 1)[1]) for entry in entries)
+        if size is not None
+    )
+    ngrams = {}
+    lowered = [entry.lower() for entry in entries]
+    for position, text in enumerate(lowered):
+        for length in range(1, NGRAM_LENGTH + 1):
+            for start in range(len(text) - length + 1):
+                ngrams.setdefault(text[start:start + length], set()).add(position)
+
+    return {
+        'entries': entries,
+        'models': entry_models,
+        'lowered': lowered,
+        'size_values': [size for size, _ in sized],
+        'size_positions': [position for _, position in sized],
+        'ngrams': ngrams,
+    }
+
+def match_size(index, operator, value):
+    """Return the positions whose parameter size satisfies `size <operator> value`, using bisection."""
+    values = index['size_values']
+    if operator in ('=', '=='):
+        bounds = (bisect_left(values, value), bisect_right(values, value))
+    elif operator == '>=':
+        bounds = (bisect_left(values, value), len(values))
+    elif operator == '>':
+        bounds = (bisect_right(values, value), len(values))
+    elif operator == '<=':
+        bounds = (0, bisect_right(values, value))
+    else:
+        bounds = (0, bisect_left(values, value))
+    return set(index['size_positions'][bounds[0]:bounds[1]])
+
+def match_keyword(index, keyword):
+    """Return the positions whose model:parameter text contains the keyword."""
+    keyword = keyword.lower()
+    if len(keyword) <= NGRAM_LENGTH:
+        return set(index['ngrams'].get(keyword, ()))
+    # Every n-gram of the keyword must be present, the substring check removes the remaining false hits
+    candidates = None
+    for start in range(len(keyword) - NGRAM_LENGTH + 1):
+        positions = index['ngrams'].get(keyword[start:start + NGRAM_LENGTH])
+        if not positions:
+            return set()
+        candidates = set(positions) if candidates is None else candidates & positions
+    return {position for position in candidates if keyword in index['lowered'][position]}
+
+def filter_catalog(index, filter_keyword):
+    """
+    Return the sorted positions of the entries matching a filter expression, or None for no filter.
+    Terms are keywords or size comparisons like '>=8b'; terms separated by spaces (or 'and', '&')
+    must all match, and groups separated by 'or' or '|' are alternatives, e.g. 'coder >=1b <=8b | qwen'.
+    """
+    if not filter_keyword or not filter_keyword.strip():
+        return None
+    matched = set()
+    for group in re.split(r'\s*\|\s*|\s+or\s+', filter_keyword.strip(), flags=re.IGNORECASE):
+        group_matches = None
+        for term in group.split():
+            if term.lower() in ('and', '&'):
+                continue
+            size_term = size_filter_regex.match(term.lower())
+            if size_term:
+                positions = match_size(index, size_term.group(1), parse_param(size_term.group(2)))
+            else:
+                positions = match_keyword(index, term)
+            group_matches = positions if group_matches is None else group_matches & positions
+            if not group_matches:
+                break
+        if group_matches:
+            matched |= group_matches
+    return sorted(matched)
+
+def display_models(models, parameters, localmodels, descriptions, filter_keyword=None, index=None, sizes=None):
     """
     Display models with each parameter as a separate entry.
     Optionally filter models by a compound expression of model:parameter or by parameter size.
+    Pass the index from build_catalog_index to avoid rebuilding it for every filter, and the
+    dict from start_size_enrichment to show the download size of every entry already known.
     """
     print("Available models:")
     columns = 4  # Reduced number of columns for better readability
 
-    # Create expanded list with model:parameter combinations
+    # Create expanded list of the matching model:parameter combinations
     model_params = []
     unique_models = set()
     model_colors = {}
     # Light colors (foreground)
-    color_codes = [32, 92, 96, 95, 94, 91, 35, 34, 95, 36]  # Replaced yellow (33) with blue (34)
-
-    # Parse filter for parameter comparison or equality
-    param_filter = None
-    if filter_keyword and re.match(r'[<>=]=?\d+(\.\d+)?[kmgb]', filter_keyword.lower()):
-        operator = filter_keyword[:2] if filter_keyword[1] in "=<>" else filter_keyword[0]
-        value = filter_keyword[len(operator):]
-        param_filter = (operator, value)
-
-    def parse_param(param):
-        """Convert parameter string like '8b', '700k', '10.5m' to a float for comparison."""
-        match = re.match(r'(\d+(\.\d+)?)([kmgb])', param.lower())
-        if not match:
-            return None
-        num, _, unit = match.groups()
-        multiplier = {'k': 1_000, 'm': 1_000_000, 'b': 1_000_000_000, 'g': 1_000_000_000}[unit]
-        return float(num) * multiplier
-
-    def matches_filter(param):
-        """Check if a parameter matches the filter condition."""
-        if not param_filter:
-            return True
-        operator, value = param_filter
-        param_value = parse_param(param)
-        filter_value = parse_param(value)
-        if param_value is None or filter_value is None:
-            return False
-        if operator == "=":
-            return param_value == filter_value
-        return eval(f"{param_value} {operator} {filter_value}")
+    color_codes = model_color_codes
+
+    if index is None:
+        index = build_catalog_index(models, parameters)
+    matched = filter_catalog(index, filter_keyword)
+    if matched is None:
+        matched = range(len(index['entries']))
 
-    # First pass to collect all entries
     color_index = 0  # Keep track of color index
-    for model in models:
-        params = parameters[model].split(',')
-        for param in params:
-            param = param.strip()
-            if param_filter and not matches_filter(param):
-                continue  # Skip entries that don't match the filter
-            entry = f"{model}:{param}"
-            if filter_keyword and not param_filter:
-                # Check if the filter matches either the model or parameter
-                if filter_keyword.lower() not in entry.lower():
-                    continue  # Skip entries that don't match the filter
-            model_params.append(entry)
-            unique_models.add(model)
-            if model not in model_colors:
-                # Sequentially assign colors, wrapping around if needed
-                model_colors[model] = color_codes[color_index % len(color_codes)]
-                color_index += 1
+    for position in matched:
+        entry = index['entries'][position]
+        model = index['models'][position]
+        model_params.append(entry)
+        unique_models.add(model)
+        if model not in model_colors:
+            # Sequentially assign colors, wrapping around if needed
+            model_colors[model] = color_codes[color_index % len(color_codes)]
+            color_index += 1
 
     if not model_params:
         print("\033[91m\nNo models match the filter. Try changing the filter keyword or press Enter to show all models.\n\033[0m")
         return model_params
 
     print(f"Total number of models: {len(model_params)}\n")
+    # Download sizes known so far, shown after the entry
+    size_labels = {}
+    if sizes:
+        for entry in model_params:
+            label = known_size_label(sizes, entry)
+            if label is not None:
+                size_labels[entry] = f" {label}"
     # Calculate lengths for formatting
-    max_length = max(len(entry) for entry in model_params)
+    max_length = max(len(entry) + len(size_labels.get(entry, '')) for entry in model_params)
     col_width = max_length + 7  # Add space for the index number and padding
 
     # Calculate items per column
@@ -415,33 +1386,270 @@ def display_models(models, parameters, localmodels, descriptions, filter_keyword
 
                 # Format the item with consistent padding
                 item = f"{number} \033[{model_colors[model]}m{model}\033[0m:{param}"
+                escape_length = 9 + (len(number) - 4 if is_local else 0)
+                if entry in size_labels:
+                    item += f"\033[90m{size_labels[entry]}\033[0m"
+                    escape_length += 9
                 # Adjust padding to account for ANSI escape sequences
-                padded_item = f"{item:<{col_width + 9 + (len(number) - 4 if is_local else 0)}}"
+                padded_item = f"{item:<{col_width + escape_length}}"
                 line += padded_item
         print(line.rstrip())
     print("\n\033[93mNote:\033[0m Models with a \033[93myellow number\033[0m are already available locally.")
     return model_params
 
 
+# Help shown by showHelp and by the live search on '?'
+help_message = (
+    "\n\033[92m[HELP]\033[0m\n"
+    "\033[94mFiltering Models:\033[0m\n"
+    "  - Enter a keyword to filter models by any part of the model name or parameter (e.g., 'model', 'parameter', or size comparison like '>=8b').\n"
+    "  - Combine terms with spaces to require all of them (e.g., 'coder >=1b <=8b'), or with 'or' / '|' for alternatives (e.g., 'qwen | llama <8b').\n"
+    "  - Press Enter to show all models without filtering.\n\n"
+    "\033[94mLive Search:\033[0m\n"
+    "  - The list is filtered as you type. PgUp/PgDn, Up/Down or Tab turn the pages, Home/End jump to the first or last page.\n"
+    "  - Backspace deletes a character, Ctrl+W a word, and Esc or Ctrl+U the whole filter.\n"
+    "  - Press Enter to keep the filter and select models by their numbers.\n\n"
+    "\033[94mSelecting Models:\033[0m\n"
+    "  - Enter the number of the model to download.\n"
+    "  - Enter 0 to change the filter and search again.\n\n"
+    "\033[94mPost-Download Options:\033[0m\n"
+    "  - Use 'Y' or 'N' to decide whether to hibernate after download.\n"
+    "  - Press Ctrl+C to cancel hibernation if it was selected.\n"
+)
+
 def showHelp():
     """Display help information."""
-    help_message = (
-        "\n\033[92m[HELP]\033[0m\n"
-        "\033[94mFiltering Models:\033[0m\n"
-        "  - Enter a keyword to filter models by any part of the model name or parameter (e.g., 'model', 'parameter', or size comparison like '>=8b').\n"
-        "  - Press Enter to show all models without filtering.\n\n"
-        "\033[94mSelecting Models:\033[0m\n"
-        "  - Enter the number of the model to download.\n"
-        "  - Enter 0 to change the filter and search again.\n\n"
-        "\033[94mPost-Download Options:\033[0m\n"
-        "  - Use 'Y' or 'N' to decide whether to hibernate after download.\n"
-        "  - Press Ctrl+C to cancel hibernation if it was selected.\n"
-    )
     print(help_message)
 
+# Exit codes of the batch mode
+EXIT_OK = 0  # Every requested model was downloaded
+EXIT_FAILED = 1  # At least one model failed or a filter matched nothing
+EXIT_USAGE = 2  # Nothing could be downloaded (bad arguments, no catalog, no models)
+EXIT_INTERRUPTED = 130  # Stopped with Ctrl+C
+
+def parse_args(argv=None):
+    """Parse the command line. Without model specs the interactive mode runs."""
+    parser = argparse.ArgumentParser(
+        description="Download models from the Ollama library. Run without arguments for the interactive mode; "
+                    "pass models, --file or --filter to download without any prompts.")
+    parser.add_argument('models', nargs='*', help="models to download, e.g. 'llama3:8b', or 'filter:<expression>'")
+    parser.add_argument('--file', action='append', default=[],
+                        help="read model specs from a file, one per line ('-' for stdin, '#' starts a comment)")
+    parser.add_argument('--filter', action='append', default=[], dest='filters',
+                        help="add every catalog entry matching a filter expression, e.g. 'coder >=1b <=8b'")
+    parser.add_argument('--concurrency', type=int, default=1, help="number of models pulled at the same time (default: 1)")
+    parser.add_argument('--backend', choices=sorted(pull_backends), default='ollama',
+                        help="pull through the Ollama server or the built-in registry downloader (default: ollama)")
+    parser.add_argument('--max-attempts', type=int, default=6,
+                        help="give up on a model after this many failed attempts (default: 6)")
+    parser.add_argument('--refresh-catalog', action='store_true', help="download a fresh model list before resolving filters")
+    parser.add_argument('--json', dest='json_output', help="write the results as JSON to this file ('-' for stdout)")
+    parser.add_argument('--hibernate', action='store_true', help="hibernate once all downloads are finished")
+    parser.add_argument('--no-sizes', action='store_true',
+                        help="interactive mode: do not look up model download sizes in the background")
+    parser.add_argument('--models-dir', metavar='DIR',
+                        help="Ollama model store the built-in downloader writes to and the disk checks look at "
+                             "(default: OLLAMA_MODELS or ~/.ollama/models; /usr/share/ollama/.ollama/models for the Linux service)")
+    parser.add_argument('--no-live-search', action='store_true',
+                        help="interactive mode: filter the list with a prompt instead of as you type")
+    parser.add_argument('--order', choices=['queue', 'smallest'],
+                        help="download in the given order or the smallest models first (default: queue, smallest with --deadline)")
+    parser.add_argument('--max-rate', type=parse_rate, metavar='RATE',
+                        help="cap the combined download rate in bytes per second, e.g. 500K, 2.5M or 1G")
+    parser.add_argument('--window', action='append', default=[], dest='windows', type=parse_window, metavar='HH:MM-HH:MM',
+                        help="only download during this daily time window, e.g. 22:00-07:00 (repeatable)")
+    parser.add_argument('--deadline', type=parse_clock, metavar='HH:MM',
+                        help="start no model after this time (HH:MM) and defer models that would not finish by then")
+    parser.add_argument('--mirror', metavar='URL',
+                        help="download through a caching registry mirror, e.g. http://192.168.1.10:5000 (implies --backend registry)")
+    parser.add_argument('--serve-mirror', metavar='[HOST:]PORT',
+                        help="run a caching registry mirror for the other machines on the network instead of downloading")
+    parser.add_argument('--mirror-dir', default=mirror_dir, help="where the mirror keeps its cache (default: registryMirror)")
+    parser.add_argument('--mirror-size', type=parse_size, default=parse_size('100G'), metavar='SIZE',
+                        help="evict the least recently used blobs once the mirror cache is larger than this (default: 100G)")
+    parser.add_argument('--metrics-log', default=metrics_log_file, metavar='PATH',
+                        help="append download and catalog timings as JSON lines to this file, '' to disable (default: downloadMetrics.jsonl)")
+    parser.add_argument('--prometheus-file', metavar='PATH',
+                        help="keep the download metrics in this file in the Prometheus text format, e.g. for node_exporter")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve the download metrics for Prometheus on http://<host>:PORT/metrics")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.max_attempts < 1:
+        parser.error("--concurrency and --max-attempts must be at least 1")
+    if args.serve_mirror is not None:
+        host, _, port = args.serve_mirror.rpartition(':')
+        if not port.isdigit():
+            parser.error("--serve-mirror expects a port or HOST:PORT")
+        args.serve_mirror = (host.strip('[]') or '0.0.0.0', int(port))
+    if args.mirror:
+        args.backend = 'registry'
+    return args
+
+def serve_mirror(args):
+    """Run the caching registry mirror until Ctrl+C and return the exit code."""
+    host, port = args.serve_mirror
+    try:
+        server = RegistryMirror(args.mirror_dir, max_bytes=args.mirror_size).serve(host, port)
+    except OSError as e:
+        print(f"\033[91mCould not start the mirror on {host}:{port}: {e}\033[0m")
+        return EXIT_USAGE
+    print(f"Registry mirror listening on \033[95mhttp://{host}:{port}\033[0m, "
+          f"caching up to {format_size(args.mirror_size)} in {args.mirror_dir}")
+    print(f"On the other machines run: python downloadModel.py --mirror http://<this machine>:{port}")
+    print("Press Ctrl+C to stop the mirror.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nMirror stopped.")
+    finally:
+        server.server_close()
+    return EXIT_OK
+
+def build_schedule(args):
+    """Create the download schedule described by the command line."""
+    deadline = next_clock_time(args.deadline) if args.deadline is not None else None
+    return DownloadSchedule(args.order, args.max_rate, args.windows, deadline,
+                            disk_path=registry_downloader.models_dir, disk_reserve=disk_reserve)
+
+def read_batch_specs(args):
+    """Collect the model specs from the arguments, the spec files and --filter, in that order."""
+    specs = list(args.models)
+    for path in args.file:
+        if path == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                specs.append(line)
+    specs += [f"filter:{expression}" for expression in args.filters]
+    return specs
+
+def resolve_batch_specs(specs, refresh_catalog=False):
+    """
+    Turn specs into a de-duplicated list of model:tag names.
+    'filter:<expression>' specs are matched against the catalog like a display_models filter.
+    Returns (models, unmatched filter specs).
+    """
+    index = None
+    models = []
+    unmatched = []
+    for spec in specs:
+        if not spec.lower().startswith('filter:'):
+            models.append(spec)
+            continue
+        if index is None:
+            if refresh_catalog or not os.path.exists(web_page_file):
+                catalog = get_model_list()
+            else:
+                try:
+                    catalog = load_local_catalog()
+                except (OSError, ValueError) as e:
+                    print(f"\033[91mError reading local model list: {e}\033[0m")
+                    catalog = get_model_list()
+            index = build_catalog_index(catalog[0], catalog[1])
+        matched = filter_catalog(index, spec[len('filter:'):])
+        if not matched:
+            print(f"\033[91mNo models match {spec!r}.\033[0m")
+            unmatched.append(spec)
+            continue
+        models += [index['entries'][position] for position in matched]
+    return list(dict.fromkeys(models)), unmatched
+
+def run_batch(args):
+    """Download the models given on the command line without any prompts and return the exit code."""
+    started_at = datetime.now(timezone.utc)
+    report = {
+        'host': socket.gethostname(),
+        'started_at': started_at.isoformat(),
+        'backend': args.backend,
+        'concurrency': args.concurrency,
+        'models': [],
+        'unmatched': [],
+    }
+    # Keep stdout clean for the JSON report when it is written there
+    log_stream = sys.stderr if args.json_output == '-' else sys.stdout
+    exit_code = EXIT_OK
+    results = {}
+    with contextlib.redirect_stdout(log_stream):
+        # Ctrl+C while the catalog is fetched or the models are planned still ends with a report
+        try:
+            try:
+                models, report['unmatched'] = resolve_batch_specs(read_batch_specs(args), args.refresh_catalog)
+            except OSError as e:
+                print(f"\033[91mCould not read model specs: {e}\033[0m")
+                models, exit_code = [], EXIT_USAGE
+            except SystemExit:
+                # get_model_list exits when the catalog cannot be fetched
+                models, exit_code = [], EXIT_USAGE
+
+            if not models:
+                if exit_code == EXIT_OK:
+                    print("\033[91mNo models to download.\033[0m")
+                    exit_code = EXIT_USAGE
+            else:
+                schedule = build_schedule(args)
+                use_schedule(schedule, args.backend)
+                plan = registry_downloader.plan(models)
+                admission = admit_models(models, plan)
+                show_admission(admission)
+                for model in admission['too_big']:
+                    # Left out instead of failing partway through with a full disk
+                    results[model] = {'status': 'no_space', 'attempts': 0, 'bytes': 0, 'duration': 0.0}
+                models = admission['fits']
+                sizes = estimate_model_sizes(models, plan) if schedule.order == 'smallest' or schedule.deadline else None
+                print(f"Downloading {len(models)} model(s): {', '.join(models)}")
+                completed = download_models(models, args.concurrency, pull_backends[args.backend], results=results,
+                                            max_attempts=args.max_attempts, interactive=False,
+                                            show_progress=log_stream.isatty(), schedule=schedule, sizes=sizes,
+                                            disk_needs=admission['needed'])
+                if not completed:
+                    exit_code = EXIT_INTERRUPTED
+                elif report['unmatched'] or any(result['status'] != 'succeeded' for result in results.values()):
+                    exit_code = EXIT_FAILED
+                if completed and args.hibernate:
+                    hibernate()
+        except KeyboardInterrupt:
+            print("\nDownload interrupted. Stopping.")
+            exit_code = EXIT_INTERRUPTED
+
+    report['models'] = [
+        {'model': model, 'status': result['status'], 'attempts': result['attempts'],
+         'bytes': result['bytes'], 'duration': round(result['duration'], 3)}
+        for model, result in results.items()
+    ]
+    finished_at = datetime.now(timezone.utc)
+    report['finished_at'] = finished_at.isoformat()
+    report['duration'] = round((finished_at - started_at).total_seconds(), 3)
+    report['exit_code'] = exit_code
+    if args.json_output == '-':
+        print(json.dumps(report, indent=2))
+    elif args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return exit_code
+
 if __name__ == "__main__":
+    args = parse_args()
+    telemetry.log_path = args.metrics_log
+    telemetry.prometheus_file = args.prometheus_file
+    if args.metrics_port:
+        try:
+            telemetry.serve_prometheus(port=args.metrics_port)
+        except OSError as e:
+            print(f"\033[91mCould not serve metrics on port {args.metrics_port}: {e}\033[0m")
+    if args.models_dir:
+        registry_downloader.models_dir = args.models_dir
+    if args.serve_mirror is not None:
+        sys.exit(serve_mirror(args))
+    if args.mirror:
+        use_mirror(args.mirror)
+    if args.models or args.file or args.filters:
+        sys.exit(run_batch(args))
     try:
-        main()
+        main(enrich_sizes=not args.no_sizes, schedule=build_schedule(args), live_search=not args.no_live_search)
     except Exception as e:
         print(f"An error occurred: {e}")
         input("Press Enter to close the program...")
\ No newline at end of file
@@ -0,0 +1,203 @@
+import os
+import re
+import time
+import shutil
+import random
+import threading
+from datetime import datetime, timedelta
+
+
+def parse_rate(text):
+    """Convert a rate like '500K', '2.5M' or '1G' (bytes per second) to a number of bytes per second."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmg]?)b?(?:/s)?\s*', text.lower())
+    if not match:
+        raise ValueError(f"Invalid rate: {text!r} (examples: 500K, 2.5M, 1G)")
+    num, unit = match.groups()
+    return int(float(num) * {'': 1, 'k': 1_000, 'm': 1_000_000, 'g': 1_000_000_000}[unit])
+
+
+def parse_clock(text):
+    """Convert 'HH:MM' to minutes after midnight."""
+    match = re.fullmatch(r'\s*(\d{1,2}):(\d{2})\s*', text)
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError(f"Invalid time: {text!r} (expected HH:MM)")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def parse_window(text):
+    """Convert a daily window like '22:00-07:00' to (start, end) minutes; a window may wrap past midnight."""
+    start, separator, end = text.partition('-')
+    if not separator:
+        raise ValueError(f"Invalid window: {text!r} (expected HH:MM-HH:MM)")
+    return parse_clock(start), parse_clock(end)
+
+
+def next_clock_time(minutes, now=None):
+    """Return the next datetime at which the local clock shows the given minutes after midnight."""
+    now = now or datetime.now()
+    target = now.replace(hour=minutes // 60, minute=minutes % 60, second=0, microsecond=0)
+    return target if target > now else target + timedelta(days=1)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all pulls, capping their combined throughput at bytes_per_second.
+    throttle() blocks the caller until it may use more bytes; add() only books bytes that were
+    already transferred, and over_budget() tells whether those bookings ran ahead of the cap.
+    """
+
+    def __init__(self, bytes_per_second, burst_seconds=2):
+        self.rate = bytes_per_second
+        self.burst = bytes_per_second * burst_seconds
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        """Add the tokens earned since the last update (lock held by the caller)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def throttle(self, num_bytes):
+        """Take num_bytes from the bucket, sleeping for as long as it is in debt."""
+        with self.lock:
+            self.refill()
+            self.tokens -= num_bytes
+            debt = -self.tokens
+        if debt > 0:
+            time.sleep(debt / self.rate)
+
+    def add(self, num_bytes):
+        """Book bytes transferred outside of throttle()."""
+        with self.lock:
+            self.refill()
+            self.tokens -= num_bytes
+
+    def over_budget(self):
+        """Check whether booked bytes ran more than the burst ahead of the cap."""
+        with self.lock:
+            self.refill()
+            return self.tokens < -self.burst
+
+    def seconds_until_within_budget(self):
+        """Return how long the pulls have to pause for the bucket to be out of debt."""
+        with self.lock:
+            self.refill()
+            return max(0.0, -self.tokens / self.rate)
+
+
+class DownloadSchedule:
+    """
+    When and in which order download_models pulls its queue:
+      order          - 'queue' keeps the selection order, 'smallest' pulls the smallest models first;
+                       defaults to 'smallest' with a deadline (most models done in time) and 'queue' otherwise
+      max_rate       - combined bytes per second of all pulls, or None for no cap
+      windows        - daily (start, end) minute windows downloads may run in, empty for any time
+      deadline       - datetime after which no new model is started, and models estimated to
+                       miss it are deferred
+      backoff_base   - first retry delay in seconds, doubled on every further attempt
+      backoff_max    - longest retry delay in seconds
+      disk_path      - directory whose disk the models are written to, None to not watch free space
+      disk_reserve   - bytes to keep free on that disk; pulls pause when it runs lower
+    """
+
+    def __init__(self, order=None, max_rate=None, windows=(), deadline=None, backoff_base=5, backoff_max=300,
+                 disk_path=None, disk_reserve=0):
+        self.order = order or ('smallest' if deadline is not None else 'queue')
+        self.rate_limiter = RateLimiter(max_rate) if max_rate else None
+        self.windows = list(windows)
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.disk_path = disk_path
+        self.disk_reserve = disk_reserve
+        self.disk_checked = (0.0, None)  # (monotonic time, free bytes) of the last free space lookup
+        # Whether download_models books progress in the rate limiter itself (the pull does not throttle)
+        self.count_progress = True
+
+    def order_queue(self, models, sizes):
+        """Return the models in download order; models of unknown size keep their place after the known ones."""
+        if self.order != 'smallest':
+            return list(models)
+        known = sorted((model for model in models if sizes.get(model) is not None), key=lambda model: sizes[model])
+        return known + [model for model in models if sizes.get(model) is None]
+
+    def in_window(self, now=None):
+        """Check whether downloads may run at this time of day."""
+        if not self.windows:
+            return True
+        now = now or datetime.now()
+        minutes = now.hour * 60 + now.minute
+        for start, end in self.windows:
+            if start <= end and start <= minutes < end:
+                return True
+            if start > end and (minutes >= start or minutes < end):
+                return True
+        return False
+
+    def next_window_start(self, now=None):
+        """Return when the next download window opens."""
+        return min(next_clock_time(start, now) for start, _ in self.windows)
+
+    def free_space(self):
+        """Return the free bytes on the disk of disk_path (looked up at most once a second), or None if unknown."""
+        checked_at, free = self.disk_checked
+        if time.monotonic() - checked_at > 1:
+            try:
+                free = shutil.disk_usage(self.disk_path).free
+            except (OSError, TypeError):
+                free = None
+            self.disk_checked = (time.monotonic(), free)
+        return free
+
+    def low_on_disk(self, needed=0):
+        """Check whether the disk has less than `needed` bytes free on top of the reserve."""
+        if self.disk_path is None:
+            return False
+        free = self.free_space()
+        return free is not None and free < needed + self.disk_reserve
+
+    def pause_reason(self, needed=0):
+        """Return why pulls have to pause right now, or None if they may run. needed is the space the pulls still have to write."""
+        if not self.in_window():
+            return f"outside the download window until {self.next_window_start():%H:%M}"
+        if self.low_on_disk(needed):
+            return f"not enough free disk space in {os.path.abspath(self.disk_path)}"
+        if self.count_progress and self.rate_limiter is not None and self.rate_limiter.over_budget():
+            return "bandwidth cap reached"
+        return None
+
+    def seconds_until_allowed(self, needed=0):
+        """Return how long to wait before pulls may (re)start."""
+        if not self.in_window():
+            return max(1.0, (self.next_window_start() - datetime.now()).total_seconds())
+        if self.low_on_disk(needed):
+            return 30.0  # Space is freed by the user, check back now and then
+        if self.count_progress and self.rate_limiter is not None:
+            return self.rate_limiter.seconds_until_within_budget()
+        return 0.0
+
+    def book_progress(self, num_bytes):
+        """Book transferred bytes against the cap when the pull does not throttle itself."""
+        if self.count_progress and self.rate_limiter is not None and num_bytes > 0:
+            self.rate_limiter.add(num_bytes)
+
+    def past_deadline(self):
+        """Check whether the deadline for starting new models has passed."""
+        return self.deadline is not None and datetime.now() >= self.deadline
+
+    def misses_deadline(self, size, throughput):
+        """Check whether a model of this size is estimated to finish after the deadline at this throughput."""
+        if self.deadline is None or not size:
+            return False
+        if self.rate_limiter is not None:
+            throughput = min(throughput or self.rate_limiter.rate, self.rate_limiter.rate)
+        if not throughput:
+            return False
+        return datetime.now() + timedelta(seconds=size / throughput) > self.deadline
+
+    def backoff_delay(self, attempt):
+        """Return the delay before retrying after the given failed attempt: exponential with jitter."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
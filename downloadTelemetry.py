@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import socket
+import threading
+import contextlib
+import http.server
+
+
+# Seconds of transfer a throughput sample covers when looking for the peak
+THROUGHPUT_WINDOW = 2.0
+
+
+def escape_label(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Telemetry:
+    """
+    Structured measurements of catalog loading and model downloads.
+    Every measurement is appended as one JSON line to log_path; running totals are written in the
+    Prometheus text format to prometheus_file (e.g. for node_exporter's textfile collector) and
+    can be served on an HTTP endpoint with serve_prometheus. Without any output it only keeps totals.
+    """
+
+    def __init__(self, log_path=None, prometheus_file=None, host=None):
+        self.log_path = log_path
+        self.prometheus_file = prometheus_file
+        self.host = host or socket.gethostname()
+        self.lock = threading.Lock()
+        self.models = {}  # {model: stats} of the models downloaded by this process
+        self.counters = {}  # {(metric name, labels): value}
+        self.gauges = {}  # {(metric name, labels): value}
+        self.server = None
+
+    def event(self, kind, **fields):
+        """Append one event to the JSON-lines log."""
+        if not self.log_path:
+            return
+        entry = {'time': round(time.time(), 3), 'host': self.host, 'event': kind}
+        entry.update(fields)
+        line = json.dumps(entry) + '\n'
+        with self.lock:
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError:
+                pass  # Telemetry must never break a download
+
+    def count(self, name, value=1, **labels):
+        """Add to a Prometheus counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """Set a Prometheus gauge."""
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    @contextlib.contextmanager
+    def timed(self, kind, **fields):
+        """
+        Time the body of a with statement and log it as one event with its duration.
+        The yielded dict can be filled with more fields while the body runs.
+        """
+        started = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            duration = time.perf_counter() - started
+            self.gauge(f"{kind}_seconds", duration)
+            self.event(kind, duration=round(duration, 6), **fields)
+            self.write_prometheus()
+
+    def attempt_started(self, model, attempt):
+        """Note the start of a pull attempt."""
+        now = time.monotonic()
+        with self.lock:
+            stats = self.models.get(model)
+            if stats is None or stats['finished']:
+                stats = self.models[model] = {
+                    'started': now, 'bytes': 0, 'attempts': 0, 'pull_time': 0.0, 'internet_wait': 0.0,
+                    'peak': 0.0, 'window': (now, 0), 'finished': False,
+                }
+            stats['attempts'] = attempt
+            stats['window'] = (now, stats['bytes'])
+        self.count('download_attempts_total')
+        self.event('attempt_started', model=model, attempt=attempt)
+
+    def model_bytes(self, model, num_bytes):
+        """Count bytes transferred for a model and update its peak throughput."""
+        now = time.monotonic()
+        with self.lock:
+            stats = self.models[model]
+            stats['bytes'] += num_bytes
+            window_start, window_bytes = stats['window']
+            if now - window_start >= THROUGHPUT_WINDOW:
+                stats['peak'] = max(stats['peak'], (stats['bytes'] - window_bytes) / (now - window_start))
+                stats['window'] = (now, stats['bytes'])
+        self.count('download_bytes_total', num_bytes)
+
+    def attempt_finished(self, model, attempt, outcome, duration):
+        """Note the end of a pull attempt: 'succeeded', 'failed', 'paused' by the schedule or 'stopped' by the user."""
+        with self.lock:
+            stats = self.models[model]
+            stats['pull_time'] += duration
+        self.count('download_seconds_total', duration)
+        self.count('download_attempts_finished_total', outcome=outcome)
+        self.event('attempt_finished', model=model, attempt=attempt, outcome=outcome, duration=round(duration, 3))
+
+    def internet_wait(self, model, seconds):
+        """Count time spent checking for and waiting on the internet connection after a failed attempt."""
+        with self.lock:
+            self.models[model]['internet_wait'] += seconds
+        self.count('internet_wait_seconds_total', seconds)
+
+    def model_finished(self, model, status):
+        """Log the summary of a model that succeeded, failed for good or was deferred."""
+        now = time.monotonic()
+        with self.lock:
+            stats = self.models.get(model)
+            if stats is None:
+                stats = {'started': now, 'bytes': 0, 'attempts': 0, 'pull_time': 0.0, 'internet_wait': 0.0, 'peak': 0.0}
+            stats['finished'] = True
+            wall_time = now - stats['started']
+            average = stats['bytes'] / stats['pull_time'] if stats['pull_time'] else 0.0
+            # A model shorter than one throughput window has its average as the peak
+            peak = max(stats['peak'], average)
+            summary = {
+                'model': model, 'status': status, 'wall_time': round(wall_time, 3), 'bytes': stats['bytes'],
+                'average_throughput': round(average, 1), 'peak_throughput': round(peak, 1),
+                'attempts': stats['attempts'], 'internet_wait': round(stats['internet_wait'], 3),
+            }
+        self.count('models_total', status=status)
+        self.gauge('model_average_throughput_bytes_per_second', average, model=model)
+        self.gauge('model_peak_throughput_bytes_per_second', peak, model=model)
+        self.gauge('model_wall_time_seconds', wall_time, model=model)
+        self.event('model', **summary)
+        self.write_prometheus()
+        return summary
+
+    def render_prometheus(self):
+        """Return the counters and gauges in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = [(name, labels, value, 'counter') for (name, labels), value in self.counters.items()]
+            metrics += [(name, labels, value, 'gauge') for (name, labels), value in self.gauges.items()]
+        lines = []
+        typed = set()
+        for name, labels, value, kind in sorted(metrics):
+            name = 'ollama_downloader_' + name
+            if name not in typed:
+                lines.append(f"# TYPE {name} {kind}")
+                typed.add(name)
+            label_text = ','.join(f'{key}="{escape_label(val)}"' for key, val in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self):
+        """Replace prometheus_file with the current metrics, if one is configured."""
+        if not self.prometheus_file:
+            return
+        temp_file = self.prometheus_file + '.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(self.render_prometheus())
+            os.replace(temp_file, self.prometheus_file)
+        except OSError:
+            pass
+
+    def serve_prometheus(self, host='0.0.0.0', port=9464):
+        """Serve the metrics on http://host:port/metrics from a background thread."""
+        telemetry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
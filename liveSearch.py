@@ -0,0 +1,340 @@
+import os
+import re
+import sys
+import time
+import codecs
+import shutil
+import textwrap
+import contextlib
+from math import ceil
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+try:
+    import tty
+    import select
+    import termios
+except ImportError:
+    termios = None
+
+
+# Foreground colors the model names cycle through; yellow (33) is kept for the numbers of local models
+model_color_codes = [32, 92, 96, 95, 94, 91, 35, 34, 95, 36]
+max_columns = 4
+# Screen lines around the grid: filter line, status line, blank line above and blank line plus note below,
+# and one spare line so writing the last line never scrolls the terminal
+frame_lines = 6
+clear_sequence = "\033[H\033[2J"
+key_hints = "PgUp/PgDn: page  Enter: select  Esc: clear  ?: help"
+
+# Keys as they arrive from a POSIX terminal in character mode
+escape_keys = {
+    '\x1b[A': 'up', '\x1b[B': 'down', '\x1b[C': 'right', '\x1b[D': 'left',
+    '\x1b[5~': 'pageup', '\x1b[6~': 'pagedown',
+    '\x1b[H': 'home', '\x1b[F': 'end', '\x1b[1~': 'home', '\x1b[4~': 'end', '\x1b[7~': 'home', '\x1b[8~': 'end',
+    '\x1bOA': 'up', '\x1bOB': 'down', '\x1bOC': 'right', '\x1bOD': 'left', '\x1bOH': 'home', '\x1bOF': 'end',
+}
+escape_regex = re.compile(r'\x1b(?:\[[0-9;]*[~A-Za-z]|O[A-Za-z])')
+control_keys = {
+    '\r': 'enter', '\n': 'enter', '\x7f': 'backspace', '\x08': 'backspace', '\t': 'pagedown',
+    '\x15': 'clear', '\x17': 'word', '\x1b': 'escape',
+}
+# Second character the Windows console sends after '\x00' or '\xe0' for special keys
+windows_keys = {'H': 'up', 'P': 'down', 'K': 'left', 'M': 'right', 'I': 'pageup', 'Q': 'pagedown', 'G': 'home', 'O': 'end'}
+
+
+def enable_virtual_terminal():
+    """
+    Let the Windows console interpret ANSI sequences. Windows 10 and later only do that for programs
+    that ask for it, otherwise the colors and cursor movements are printed as text.
+    """
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            # ENABLE_PROCESSED_OUTPUT | ENABLE_VIRTUAL_TERMINAL_PROCESSING
+            if kernel32.SetConsoleMode(handle, mode.value | 0x0001 | 0x0004):
+                return
+    except (ImportError, AttributeError, OSError):
+        pass
+    os.system('')  # Running any command through cmd leaves the console with the sequences enabled
+
+
+if msvcrt is not None:
+    enable_virtual_terminal()
+
+
+def clear_screen():
+    """Clear the terminal with ANSI sequences instead of spawning cls or clear."""
+    sys.stdout.write(clear_sequence)
+    sys.stdout.flush()
+
+
+def live_search_supported():
+    """Check whether stdin and stdout are a terminal that keys can be read from one at a time."""
+    try:
+        interactive = sys.stdin.isatty() and sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+    return interactive and (msvcrt is not None or termios is not None)
+
+
+def split_key(text):
+    """Split the first key off text read from the terminal and return (key name or character, rest)."""
+    if text.startswith('\x1b') and len(text) > 1:
+        match = escape_regex.match(text)
+        if match:
+            return escape_keys.get(match.group(), 'unknown'), text[match.end():]
+    return control_keys.get(text[0], text[0]), text[1:]
+
+
+@contextlib.contextmanager
+def key_reader():
+    """
+    Switch the terminal to character mode for the body of a with statement and yield
+    read_key(timeout), which returns the next key, or None if none was pressed within timeout seconds.
+    Ctrl+C still raises KeyboardInterrupt, and the terminal mode is restored on the way out.
+    """
+    if msvcrt is not None:
+        yield read_windows_key
+        return
+
+    fd = sys.stdin.fileno()
+    decoder = codecs.getincrementaldecoder(sys.stdin.encoding or 'utf-8')(errors='replace')
+    pending = ['']
+
+    def read_key(timeout=None):
+        while not pending[0] or pending[0] == '\x1b':
+            # A lone escape is either the Esc key or the start of a sequence still on its way
+            wait = 0.05 if pending[0] else timeout
+            if not select.select([fd], [], [], wait)[0]:
+                if pending[0]:
+                    break
+                return None
+            pending[0] += decoder.decode(os.read(fd, 256))
+        key, pending[0] = split_key(pending[0])
+        return key
+
+    saved = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd)
+        yield read_key
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+
+def read_windows_key(timeout=None):
+    """read_key of the Windows console."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not msvcrt.kbhit():
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        time.sleep(0.02)
+    char = msvcrt.getwch()
+    if char in ('\x00', '\xe0'):
+        return windows_keys.get(msvcrt.getwch(), 'unknown')
+    if char == '\x03':
+        raise KeyboardInterrupt
+    return control_keys.get(char, char)
+
+
+class LiveSearch:
+    """
+    Full-screen model list that is filtered as the user types.
+    Only the page of the grid that fits the terminal is laid out, the colored text of every entry
+    is formatted once and reused across keystrokes, and a frame only rewrites the screen lines that
+    changed since the previous one. Entries are numbered like display_models numbers them, so the
+    numbers shown are the ones select_models takes.
+      index      - catalog index from build_catalog_index
+      localmodels - entries already available locally, shown with a yellow number
+      search     - function returning the sorted positions matching a filter, or None for all
+      size_label - function returning the text shown after an entry (its download size), or None
+      help_text  - text shown when '?' is pressed
+    """
+
+    def __init__(self, index, localmodels, search, size_label=None, help_text='', output=None):
+        self.index = index
+        self.localmodels = localmodels
+        self.search = search
+        self.size_label = size_label
+        self.help_text = help_text
+        self.output = output or sys.stdout
+        self.query = ''
+        self.page = 0
+        self.showing_help = False
+        self.matches = {}  # {query: positions} of recent queries, for typing back over them
+        self.cells = {}  # {position: (size label, colored text, visible length)}
+        self.frame = []  # Screen lines of the last frame
+        self.frame_size = None  # Terminal size the last frame was drawn for
+        # Colors follow the catalog order, so a model keeps its color whatever the filter
+        self.model_colors = {}
+        for model in index['models']:
+            if model not in self.model_colors:
+                self.model_colors[model] = model_color_codes[len(self.model_colors) % len(model_color_codes)]
+
+    def matched(self):
+        """Return the positions matching the current query."""
+        positions = self.matches.get(self.query)
+        if positions is None:
+            positions = self.search(self.query)
+            if positions is None:
+                positions = range(len(self.index['entries']))
+            if len(self.matches) >= 64:
+                self.matches.clear()
+            self.matches[self.query] = positions
+        return positions
+
+    def cell(self, position):
+        """Return the colored text of an entry without its number, and its visible length."""
+        label = self.size_label(self.index['entries'][position]) if self.size_label else None
+        cached = self.cells.get(position)
+        if cached is None or cached[0] != label:
+            entry = self.index['entries'][position]
+            model, param = entry.split(':', 1)
+            text = f"\033[{self.model_colors[model]}m{model}\033[0m:{param}"
+            length = len(entry)
+            if label:
+                text += f"\033[90m {label}\033[0m"
+                length += len(label) + 1
+            cached = self.cells[position] = (label, text, length)
+        return cached[1], cached[2]
+
+    def layout(self, width, height):
+        """Return the screen lines for a terminal of this size and the column to put the cursor in."""
+        query = self.query[-max(1, width - 10):]
+        lines = [f"\033[92mFilter\033[0m: {query}"]
+        cursor_column = len("Filter: ") + len(query) + 1
+        rows = max(1, height - frame_lines)
+
+        if self.showing_help:
+            lines += ["\033[90mPress any key to return to the list.\033[0m", ""]
+            for text in self.help_text.strip('\n').split('\n'):
+                lines += textwrap.wrap(text, max(20, width - 1), subsequent_indent='    ') or ['']
+            return lines[:rows + 5], cursor_column
+
+        matched = self.matched()
+        if not matched:
+            lines += ["Total number of models: 0", ""]
+            lines.append("\033[91mNo models match the filter.\033[0m")
+            lines.append("\033[90mPress Backspace or Esc to change it.\033[0m")
+            return lines, cursor_column
+
+        # Fit as many columns as the terminal width takes, at most max_columns
+        for columns in range(max_columns, 0, -1):
+            page_size = rows * columns
+            pages = ceil(len(matched) / page_size)
+            page = min(max(self.page, 0), pages - 1)
+            start = page * page_size
+            items = matched[start:start + page_size]
+            cells = [self.cell(position) for position in items]
+            number_width = max(3, len(str(start + len(items))))
+            col_width = number_width + 2 + max(length for _, length in cells) + 2
+            if columns == 1 or columns * col_width <= width:
+                break
+        self.page = page
+
+        status = f"Total number of models: {len(matched)}    Page {page + 1}/{pages}"
+        if len(status) + 4 + len(key_hints) < width:
+            status += f"    \033[90m{key_hints}\033[0m"
+        lines.append(status)
+        lines.append("")
+        entries = self.index['entries']
+        items_per_col = ceil(len(items) / columns)
+        for row in range(items_per_col):
+            line = ""
+            for col in range(columns):
+                i = row + col * items_per_col
+                if i >= len(items):
+                    break
+                number = f"{str(start + i + 1).rjust(number_width)}."
+                if entries[items[i]] in self.localmodels:
+                    number = f"\033[93m{number}\033[0m"  # Use yellow color for the number if local
+                text, length = cells[i]
+                line += f"{number} {text}{' ' * (col_width - number_width - 2 - length)}"
+            lines.append(line.rstrip())
+        lines.append("")
+        lines.append("\033[93mNote:\033[0m Models with a \033[93myellow number\033[0m are already available locally.")
+        return lines, cursor_column
+
+    def render(self, width, height):
+        """Draw the current state, rewriting only the lines that differ from the last frame."""
+        lines, cursor_column = self.layout(width, height)
+        out = ["\033[?25l"]  # Hide the cursor while drawing
+        if self.frame_size != (width, height):
+            out.append(clear_sequence)
+            self.frame = []
+            self.frame_size = (width, height)
+        for row, line in enumerate(lines):
+            if row >= len(self.frame) or self.frame[row] != line:
+                out.append(f"\033[{row + 1};1H{line}\033[K")
+        if len(lines) < len(self.frame):
+            out.append(f"\033[{len(lines) + 1};1H\033[J")
+        out.append(f"\033[1;{cursor_column}H\033[?25h")
+        self.frame = lines
+        self.output.write(''.join(out))
+        self.output.flush()
+
+    def refresh(self):
+        """Draw the current state for the size the terminal has now."""
+        size = shutil.get_terminal_size()
+        self.render(size.columns, size.lines)
+
+    def handle_key(self, key):
+        """Apply one key to the state. Returns True when the user selected the matching models."""
+        if self.showing_help:
+            self.showing_help = False
+            return False
+        if key == 'enter':
+            return len(self.matched()) > 0
+        if key == 'backspace':
+            self.query = self.query[:-1]
+        elif key in ('escape', 'clear'):
+            self.query = ''
+        elif key == 'word':
+            self.query = re.sub(r'\S*\s*$', '', self.query)
+        elif key in ('pagedown', 'down'):
+            self.page += 1
+            return False
+        elif key in ('pageup', 'up'):
+            self.page -= 1
+            return False
+        elif key == 'home':
+            self.page = 0
+            return False
+        elif key == 'end':
+            self.page = len(self.index['entries'])  # Clamped to the last page by layout
+            return False
+        elif key == '?':
+            self.showing_help = True
+            return False
+        elif len(key) == 1 and key.isprintable():
+            self.query += key
+        else:
+            return False
+        self.page = 0
+        return False
+
+    def run(self):
+        """
+        Let the user filter the list until Enter is pressed, then return the query and the
+        matching entries in the order they are numbered in. The last frame is left on the screen.
+        Without a keystroke the list is redrawn every second, to show download sizes as they are looked up.
+        """
+        self.frame = []
+        self.frame_size = None
+        with key_reader() as read_key:
+            while True:
+                self.refresh()
+                key = read_key(1.0)
+                # Apply keys that are already waiting (typed quickly or pasted) before drawing again
+                while key is not None:
+                    if self.handle_key(key):
+                        self.refresh()
+                        self.output.write(f"\033[{len(self.frame) + 1};1H")
+                        entries = self.index['entries']
+                        return self.query, [entries[position] for position in self.matched()]
+                    key = read_key(0)
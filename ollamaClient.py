@@ -0,0 +1,167 @@
+import os
+import json
+import threading
+import http.client
+import urllib.parse
+
+
+# Address the Ollama server listens on when OLLAMA_HOST is not set
+default_ollama_host = "127.0.0.1:11434"
+
+
+def ollama_base_url(host=None):
+    """
+    Return the base URL of the local Ollama server.
+    Accepts the same forms as OLLAMA_HOST: 'host', 'host:port', ':port' or a full 'http(s)://host:port' URL.
+    """
+    host = (host if host is not None else os.environ.get('OLLAMA_HOST', '')).strip() or default_ollama_host
+    if '://' not in host:
+        if host.count(':') > 1 and not host.startswith('['):
+            host = f"[{host}]"  # Bare IPv6 address without a port
+        host = 'http://' + host
+    parsed_url = urllib.parse.urlparse(host)
+    hostname = parsed_url.hostname or '127.0.0.1'
+    if hostname == '0.0.0.0':
+        hostname = '127.0.0.1'  # The server binds to all interfaces, connect through loopback
+    port = parsed_url.port or (443 if parsed_url.scheme == 'https' else 11434)
+    if ':' in hostname:
+        hostname = f"[{hostname}]"
+    return f"{parsed_url.scheme}://{hostname}:{port}{parsed_url.path.rstrip('/')}"
+
+
+class OllamaError(Exception):
+    """Raised when the Ollama server answers with an error."""
+
+
+class OllamaClient:
+    """
+    Minimal client for the REST API of a local Ollama server.
+    Every thread keeps one keep-alive connection that is reused for all its requests.
+    """
+
+    def __init__(self, host=None, timeout=30):
+        self.base_url = ollama_base_url(host)
+        parsed_url = urllib.parse.urlparse(self.base_url)
+        self.scheme = parsed_url.scheme
+        self.netloc = parsed_url.netloc
+        self.path_prefix = parsed_url.path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            if self.scheme == 'https':
+                conn = http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection, the next request opens a new one."""
+        conn = getattr(self.local, 'conn', None)
+        self.local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def set_read_timeout(self, timeout):
+        """Change the socket timeout of this thread's open connection, if it has one."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None and conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    def send(self, method, path, payload=None):
+        """Send a request on the keep-alive connection and return the response, reconnecting once if it went stale."""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        for attempt in (1, 2):
+            conn = self.connection()
+            try:
+                conn.request(method, self.path_prefix + path, body=body, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError):
+                # The server closed the idle connection, retry once on a fresh one
+                self.close()
+                if attempt == 2:
+                    raise
+            except BaseException:
+                self.close()
+                raise
+
+    def request_json(self, method, path, payload=None):
+        """Send a request and return the decoded JSON answer."""
+        response = self.send(method, path, payload)
+        try:
+            data = response.read()
+        except BaseException:
+            self.close()
+            raise
+        result = json.loads(data) if data else {}
+        if response.status != 200:
+            message = result.get('error') if isinstance(result, dict) else None
+            raise OllamaError(message or f"HTTP error: {response.status} {response.reason}")
+        return result
+
+    def list_models(self):
+        """Return the model:tag names available locally."""
+        return [model['name'] for model in self.request_json('GET', '/api/tags').get('models', [])]
+
+    def show(self, model):
+        """Return the details the server reports for a local model."""
+        return self.request_json('POST', '/api/show', {'model': model})
+
+    def pull(self, model, on_progress=None, should_stop=None):
+        """
+        Pull a model and return True once the server reports success.
+        The streamed status lines are passed to on_progress(completed_bytes, total_bytes, status, new_bytes),
+        with the byte counts summed over all layers. new_bytes is what was transferred since the previous
+        line: the first report of a layer only sets its baseline, as it includes bytes already on disk
+        from earlier pulls. should_stop is polled between status lines and cancels the pull when it returns True.
+        """
+        response = self.send('POST', '/api/pull', {'model': model, 'stream': True})
+        totals = {}
+        completed = {}
+        status = None
+        # Only connecting and the response headers are timed out: after the download the server hashes
+        # every layer without sending a line, which takes minutes for a large model
+        self.set_read_timeout(None)
+        try:
+            if response.status != 200:
+                data = response.read()
+                try:
+                    message = json.loads(data).get('error')
+                except (ValueError, AttributeError):
+                    message = None
+                raise OllamaError(message or f"HTTP error: {response.status} {response.reason}")
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                update = json.loads(line)
+                if 'error' in update:
+                    raise OllamaError(update['error'])
+                status = update.get('status')
+                digest = update.get('digest')
+                new_bytes = 0
+                if digest and 'total' in update:
+                    done = update.get('completed', 0)
+                    if digest in completed:
+                        new_bytes = max(0, done - completed[digest])
+                    totals[digest] = update['total']
+                    completed[digest] = done
+                if on_progress is not None:
+                    on_progress(sum(completed.values()), sum(totals.values()), status, new_bytes)
+                if should_stop is not None and should_stop():
+                    # Dropping the connection cancels the pull on the server
+                    self.close()
+                    return False
+        except BaseException:
+            self.close()
+            raise
+        finally:
+            self.set_read_timeout(self.timeout)
+        return status == 'success'
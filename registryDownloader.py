@@ -0,0 +1,423 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+import urllib.parse
+
+
+# Registry the Ollama library models are pulled from
+registry_url = "https://registry.ollama.ai"
+manifest_media_type = "application/vnd.docker.distribution.manifest.v2+json"
+
+
+# Model store of the Linux install script, whose service runs as the ollama user
+service_models_dir = '/usr/share/ollama/.ollama/models'
+
+
+def ollama_models_dir():
+    """
+    Return the directory Ollama stores its manifests and blobs in: OLLAMA_MODELS, the user's
+    ~/.ollama/models, or the store of the Linux service when the user has none.
+    """
+    if os.environ.get('OLLAMA_MODELS'):
+        return os.environ['OLLAMA_MODELS']
+    user_models_dir = os.path.join(os.path.expanduser('~'), '.ollama', 'models')
+    if not os.path.isdir(user_models_dir) and os.path.isdir(service_models_dir):
+        return service_models_dir
+    return user_models_dir
+
+
+def parse_model_name(model):
+    """Split 'namespace/name:tag' into its parts, defaulting to the library namespace and the latest tag."""
+    name, _, tag = model.partition(':')
+    namespace, _, name = name.rpartition('/')
+    return namespace or 'library', name, tag or 'latest'
+
+
+def manifest_layers(manifest):
+    """Return every blob a manifest references, layers first and the config last."""
+    layers = list(manifest.get('layers', []))
+    if manifest.get('config'):
+        layers.append(manifest['config'])
+    return layers
+
+
+class RegistryError(Exception):
+    """Raised when the registry answers unexpectedly or a blob fails verification."""
+
+
+class ManifestNotFound(RegistryError):
+    """Raised when the registry has no manifest for a model:tag."""
+
+
+class RegistryDownloader:
+    """
+    Pull models straight from the registry into the local Ollama model store.
+    Every blob is fetched with several parallel HTTP Range requests, verified against its
+    SHA-256 digest while it is written, and resumed from its partial file after a failure.
+    """
+
+    def __init__(self, base_url=None, models_dir=None, connections=4, chunk_size=64 * 1024 * 1024, timeout=30,
+                 mirror_url=None):
+        self.base_url = (base_url or registry_url).rstrip('/')
+        # Caching mirror the manifests and blobs are fetched through; models are still stored under base_url's host
+        self.mirror_url = mirror_url.rstrip('/') if mirror_url else None
+        self.models_dir = models_dir or ollama_models_dir()
+        self.connections = connections
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.local = threading.local()
+        self.manifests = {}  # Manifests resolved by plan(), used once by the next pull of that model
+        self.blob_locks = {}  # One lock per digest so a blob shared by several pulls is fetched once
+        self.blob_locks_guard = threading.Lock()
+        self.rate_limiter = None  # Shared RateLimiter capping the combined throughput of all chunk workers
+
+    def connection(self, parsed_url):
+        """Return this thread's keep-alive connection to the host of parsed_url."""
+        conns = getattr(self.local, 'conns', None)
+        if conns is None:
+            conns = self.local.conns = {}
+        key = (parsed_url.scheme, parsed_url.netloc)
+        if key not in conns:
+            if parsed_url.scheme == 'http':
+                conns[key] = http.client.HTTPConnection(parsed_url.netloc, timeout=self.timeout)
+            else:
+                conns[key] = http.client.HTTPSConnection(parsed_url.netloc, timeout=self.timeout)
+        return conns[key]
+
+    def drop_connection(self, parsed_url):
+        """Close this thread's connection to the host of parsed_url."""
+        conn = getattr(self.local, 'conns', {}).pop((parsed_url.scheme, parsed_url.netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def request(self, url, headers=None):
+        """
+        GET url, following redirects, and return (response, final_url).
+        The caller reads or closes the response before the next request on this thread.
+        """
+        for _ in range(5):
+            parsed_url = urllib.parse.urlparse(url)
+            path = parsed_url.path + ('?' + parsed_url.query if parsed_url.query else '')
+            for attempt in (1, 2):
+                conn = self.connection(parsed_url)
+                try:
+                    conn.request('GET', path, headers=headers or {})
+                    response = conn.getresponse()
+                    break
+                except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError):
+                    # The idle keep-alive connection was closed by the server, retry once on a fresh one
+                    self.drop_connection(parsed_url)
+                    if attempt == 2:
+                        raise
+                except BaseException:
+                    self.drop_connection(parsed_url)
+                    raise
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+            return response, url
+        raise RegistryError(f"Too many redirects for {url}")
+
+    def source_url(self):
+        """Return the URL manifests and blobs are fetched from: the mirror if one is set, the registry otherwise."""
+        return self.mirror_url or self.base_url
+
+    def fetch_manifest(self, model):
+        """Return (manifest, raw manifest bytes) for a model:tag."""
+        namespace, name, tag = parse_model_name(model)
+        url = f"{self.source_url()}/v2/{namespace}/{name}/manifests/{tag}"
+        response, _ = self.request(url, {'Accept': manifest_media_type})
+        raw = response.read()
+        if response.status == 404:
+            raise ManifestNotFound(f"Model {model} not found in the registry")
+        if response.status != 200:
+            raise RegistryError(f"HTTP error: {response.status} {response.reason}")
+        return json.loads(raw), raw
+
+    def listed_name(self, model):
+        """Return the name the Ollama server lists a model pulled by this downloader under."""
+        namespace, name, tag = parse_model_name(model)
+        registry_host = urllib.parse.urlparse(self.base_url).netloc
+        if registry_host != urllib.parse.urlparse(registry_url).netloc:
+            return f"{registry_host}/{namespace}/{name}:{tag}"
+        return f"{name}:{tag}" if namespace == 'library' else f"{namespace}/{name}:{tag}"
+
+    def manifest_path(self, model):
+        """Return where the Ollama model store keeps the manifest of a model:tag."""
+        namespace, name, tag = parse_model_name(model)
+        registry_host = urllib.parse.urlparse(self.base_url).netloc
+        return os.path.join(self.models_dir, 'manifests', registry_host, namespace, name, tag)
+
+    def blob_path(self, digest):
+        """Return where the Ollama model store keeps a blob."""
+        return os.path.join(self.models_dir, 'blobs', digest.replace(':', '-'))
+
+    def has_blob(self, digest, size):
+        """Check whether a complete blob is already in the model store."""
+        try:
+            return os.path.getsize(self.blob_path(digest)) == size
+        except OSError:
+            return False
+
+    def load_chunks(self, digest, size, partial_file, state_file):
+        """Return the chunk table [start, length, done] of a partial blob, resuming saved progress when possible."""
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if (state.get('digest') == digest and state.get('size') == size
+                    and os.path.getsize(partial_file) == size):
+                return state['chunks']
+        except (OSError, ValueError, KeyError):
+            pass
+        with open(partial_file, 'wb') as f:
+            f.truncate(size)
+        return [[start, min(self.chunk_size, size - start), 0] for start in range(0, size, self.chunk_size)] or [[0, 0, 0]]
+
+    def save_chunks(self, digest, size, chunks, partial_file, state_file):
+        """Persist the chunk table once the bytes it counts are safely on disk."""
+        with open(partial_file, 'rb+') as f:
+            os.fsync(f.fileno())
+        temp_file = state_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'digest': digest, 'size': size, 'chunks': chunks}, f)
+        os.replace(temp_file, state_file)
+
+    def download_blob(self, namespace, name, digest, size, on_bytes=None, should_stop=None):
+        """
+        Download one blob into the model store and return True, or False if should_stop cancelled it.
+        Progress is reported as on_bytes(bytes_done_for_this_blob). When another pull is already
+        fetching the same digest this waits for it and then reuses its result.
+        """
+        with self.blob_locks_guard:
+            blob_lock = self.blob_locks.setdefault(digest, threading.Lock())
+        while not blob_lock.acquire(timeout=0.5):
+            if should_stop is not None and should_stop():
+                return False
+        try:
+            return self.fetch_blob(namespace, name, digest, size, on_bytes, should_stop)
+        finally:
+            blob_lock.release()
+
+    def fetch_blob(self, namespace, name, digest, size, on_bytes=None, should_stop=None):
+        """Download one blob without coordinating with other pulls, see download_blob."""
+        final_file = self.blob_path(digest)
+        if self.has_blob(digest, size):
+            if on_bytes is not None:
+                on_bytes(size)
+            return True
+        os.makedirs(os.path.dirname(final_file), exist_ok=True)
+        if size == 0:
+            if digest != 'sha256:' + hashlib.sha256(b'').hexdigest():
+                raise RegistryError(f"Digest mismatch for empty blob {digest}")
+            open(final_file, 'wb').close()
+            return True
+        partial_file = final_file + '.partial'
+        state_file = partial_file + '.json'
+        chunks = self.load_chunks(digest, size, partial_file, state_file)
+
+        # Find the final location of the blob (usually a CDN redirect) and whether it serves ranges
+        url = f"{self.source_url()}/v2/{namespace}/{name}/blobs/{digest}"
+        response, url = self.request(url, {'Range': 'bytes=0-0'})
+        if response.status == 200:
+            # No range support, fall back to one sequential download from the start
+            response.close()
+            self.drop_connection(urllib.parse.urlparse(url))
+            chunks = [[0, size, 0]]
+            ranged = False
+        elif response.status == 206:
+            response.read()
+            ranged = True
+        else:
+            response.read()
+            raise RegistryError(f"HTTP error: {response.status} {response.reason} for blob {digest}")
+
+        lock = threading.Condition()
+        stop = threading.Event()
+        errors = []
+        queue = [index for index, (_, length, done) in enumerate(chunks) if done < length]
+
+        def bytes_done():
+            return sum(done for _, _, done in chunks)
+
+        def contiguous_prefix():
+            """Return how many bytes from the start of the blob are written without a gap (lock held by the caller)."""
+            prefix = 0
+            for start, length, done in chunks:
+                prefix = start + done
+                if done < length:
+                    break
+            return prefix
+
+        def fetch_chunks():
+            """Fetch queued chunks on this thread's connection until none are left."""
+            try:
+                with open(partial_file, 'rb+', buffering=0) as f:
+                    while not stop.is_set():
+                        with lock:
+                            if not queue:
+                                return
+                            index = queue.pop(0)
+                        start, length, done = chunks[index]
+                        headers = {'Range': f"bytes={start + done}-{start + length - 1}"} if ranged else {}
+                        response, _ = self.request(url, headers)
+                        if response.status != (206 if ranged else 200):
+                            response.read()
+                            raise RegistryError(f"HTTP error: {response.status} {response.reason} for blob {digest}")
+                        f.seek(start + done)
+                        while done < length and not stop.is_set():
+                            data = response.read(min(1024 * 1024, length - done))
+                            if not data:
+                                raise RegistryError(f"Connection closed early while downloading blob {digest}")
+                            f.write(data)
+                            if self.rate_limiter is not None:
+                                self.rate_limiter.throttle(len(data))
+                            done += len(data)
+                            with lock:
+                                chunks[index][2] = done
+                                lock.notify_all()
+                        if done < length:
+                            # Stopped halfway, the rest of the response is not needed
+                            self.drop_connection(urllib.parse.urlparse(url))
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+                with lock:
+                    lock.notify_all()
+
+        if on_bytes is not None:
+            on_bytes(bytes_done())  # What the partial file already holds, before anything is transferred
+        workers = [threading.Thread(target=fetch_chunks, daemon=True) for _ in range(min(self.connections, len(queue)) if ranged else 1)]
+        for worker in workers:
+            worker.start()
+
+        # Hash the contiguous downloaded prefix while the workers fill in the rest
+        digest_hash = hashlib.sha256()
+        hashed = 0
+        last_save = time.monotonic()
+        try:
+            # Unbuffered, a read-ahead buffer would keep bytes from beyond the prefix that are not written yet
+            with open(partial_file, 'rb', buffering=0) as reader:
+                while True:
+                    with lock:
+                        prefix = contiguous_prefix()
+                        if prefix <= hashed and not stop.is_set():
+                            # Nothing new to hash, wait for the workers instead of missing a notify that came early
+                            lock.wait(0.5)
+                            prefix = contiguous_prefix()
+                    while hashed < prefix:
+                        data = reader.read(min(1024 * 1024, prefix - hashed))
+                        digest_hash.update(data)
+                        hashed += len(data)
+                    if on_bytes is not None:
+                        on_bytes(bytes_done())
+                    if should_stop is not None and should_stop():
+                        stop.set()
+                    if stop.is_set() or hashed >= size:
+                        break
+                    if time.monotonic() - last_save > 5:
+                        self.save_chunks(digest, size, chunks, partial_file, state_file)
+                        last_save = time.monotonic()
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+            if hashed < size:
+                self.save_chunks(digest, size, chunks, partial_file, state_file)
+
+        if errors:
+            raise errors[0]
+        if hashed < size:
+            return False
+        if 'sha256:' + digest_hash.hexdigest() != digest:
+            os.remove(partial_file)
+            if os.path.exists(state_file):
+                os.remove(state_file)
+            raise RegistryError(f"Digest mismatch for blob {digest}, the partial download was discarded")
+        os.replace(partial_file, final_file)
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        return True
+
+    def write_manifest(self, model, raw_manifest):
+        """Install a manifest in the model store, which makes the model visible to Ollama."""
+        path = self.manifest_path(model)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = path + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(raw_manifest)
+        os.replace(temp_file, path)
+
+    def pull(self, model, on_progress=None, should_stop=None):
+        """
+        Pull a model:tag into the model store and return True on success.
+        Uses the same callbacks as OllamaClient.pull: on_progress(completed_bytes, total_bytes, status, new_bytes),
+        where a blob's first report is the part resumed from its partial file and not counted as new.
+        """
+        namespace, name, _ = parse_model_name(model)
+        manifest, raw_manifest = self.manifests.pop(model, None) or self.fetch_manifest(model)
+        layers = manifest_layers(manifest)
+        total = sum(layer['size'] for layer in layers)
+        completed = {}
+
+        for layer in layers:
+            digest = layer['digest']
+
+            def on_bytes(done, digest=digest):
+                new_bytes = max(0, done - completed[digest]) if digest in completed else 0
+                completed[digest] = done
+                if on_progress is not None:
+                    on_progress(sum(completed.values()), total, f"pulling {digest[7:19]}", new_bytes)
+
+            if not self.download_blob(namespace, name, digest, layer['size'], on_bytes, should_stop):
+                return False
+        self.write_manifest(model, raw_manifest)
+        if on_progress is not None:
+            on_progress(total, total, 'success', 0)
+        return True
+
+    def plan(self, models, max_workers=8):
+        """
+        Resolve the manifests of several models at once and work out what really has to be transferred.
+        Returns a dict with:
+          models         - {model: {'size': bytes, 'blobs': [digest, ...]}} for every resolved model
+          failed         - {model: error message} for models whose manifest could not be resolved
+          blobs          - {digest: size} of every unique blob the resolved models need
+          local          - set of those digests already in the model store
+          total_bytes    - size of all resolved models added up, shared blobs counted once per model
+          transfer_bytes - size of the unique blobs that are not in the model store yet
+        """
+        plan = {'models': {}, 'failed': {}, 'blobs': {}, 'local': set(), 'total_bytes': 0, 'transfer_bytes': 0}
+        unique_models = list(dict.fromkeys(models))
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique_models)))) as executor:
+            results = list(executor.map(self.try_fetch_manifest, unique_models))
+        for model, (result, error) in zip(unique_models, results):
+            if error is not None:
+                plan['failed'][model] = error
+                continue
+            self.manifests[model] = result
+            layers = manifest_layers(result[0])
+            plan['models'][model] = {
+                'size': sum(layer['size'] for layer in layers),
+                'blobs': [layer['digest'] for layer in layers],
+            }
+            plan['total_bytes'] += plan['models'][model]['size']
+            for layer in layers:
+                plan['blobs'][layer['digest']] = layer['size']
+        for digest, size in plan['blobs'].items():
+            if self.has_blob(digest, size):
+                plan['local'].add(digest)
+            else:
+                plan['transfer_bytes'] += size
+        return plan
+
+    def try_fetch_manifest(self, model):
+        """Return (fetch_manifest result, None) or (None, error message) so one bad model does not stop a plan."""
+        try:
+            return self.fetch_manifest(model), None
+        except (OSError, RegistryError, ValueError, http.client.HTTPException) as e:
+            return None, str(e) or e.__class__.__name__
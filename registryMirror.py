@@ -0,0 +1,327 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import http.server
+import http.client
+
+from registryDownloader import RegistryDownloader, manifest_media_type
+
+
+# Paths of the registry API the mirror answers, with the parts that end up in cache file names
+manifest_path_regex = re.compile(r'^/v2/(?P<repo>[a-z0-9._-]+(?:/[a-z0-9._-]+)*)/manifests/(?P<ref>[A-Za-z0-9._:-]+)$')
+blob_path_regex = re.compile(r'^/v2/(?P<repo>[a-z0-9._-]+(?:/[a-z0-9._-]+)*)/blobs/(?P<digest>sha256:[0-9a-f]{64})$')
+range_regex = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+
+def parse_size(text):
+    """Convert a size like '500M', '200G' or '1T' to a number of bytes."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgt]?)b?\s*', text.lower())
+    if not match:
+        raise ValueError(f"Invalid size: {text!r} (examples: 500M, 200G, 1T)")
+    num, unit = match.groups()
+    return int(float(num) * {'': 1, 'k': 1e3, 'm': 1e6, 'g': 1e9, 't': 1e12}[unit])
+
+
+class MirrorError(Exception):
+    """Raised when the upstream registry cannot provide what a client asked the mirror for."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RegistryMirror:
+    """
+    Caching pull-through mirror of a model registry for the machines on one network.
+    Manifests are cached for manifest_ttl seconds, blobs are stored by digest and evicted least
+    recently used first once they take more than max_bytes. A blob is fetched from upstream once;
+    clients asking for it meanwhile are served from the partial file as it grows.
+    """
+
+    def __init__(self, cache_dir, upstream=None, max_bytes=100 * 10 ** 9, manifest_ttl=600, timeout=30):
+        self.cache_dir = cache_dir
+        self.blobs_dir = os.path.join(cache_dir, 'blobs')
+        self.manifests_dir = os.path.join(cache_dir, 'manifests')
+        self.max_bytes = max_bytes
+        self.manifest_ttl = manifest_ttl
+        # Reuses the downloader's redirect handling and per-thread keep-alive connections
+        self.upstream = RegistryDownloader(upstream, cache_dir, timeout=timeout)
+        self.lock = threading.Condition()
+        self.blobs = {}  # {digest: [size, last used]} of the complete blobs on disk
+        self.fetches = {}  # {digest: state} of the blobs being fetched from upstream
+        self.readers = {}  # {digest: number of clients reading the blob}, those are never evicted
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        for entry in os.scandir(self.blobs_dir):
+            if entry.name.endswith('.partial'):
+                os.remove(entry.path)  # Left behind by an interrupted run, fetched again on demand
+            elif entry.name.startswith('sha256-') and entry.is_file():
+                # The modification time doubles as the last use, so the LRU order survives a restart
+                stat = entry.stat()
+                self.blobs[entry.name.replace('-', ':', 1)] = [stat.st_size, stat.st_mtime]
+
+    def blob_file(self, digest):
+        """Return where the mirror keeps a blob."""
+        return os.path.join(self.blobs_dir, digest.replace(':', '-'))
+
+    def cached_bytes(self):
+        """Return the size of all complete blobs in the cache (lock held by the caller)."""
+        return sum(size for size, _ in self.blobs.values())
+
+    def evict(self, incoming=0):
+        """Remove least recently used blobs nobody is reading until `incoming` more bytes fit the budget (lock held by the caller)."""
+        total = self.cached_bytes()
+        for digest, (size, _) in sorted(self.blobs.items(), key=lambda item: item[1][1]):
+            if total + incoming <= self.max_bytes:
+                break
+            if self.readers.get(digest):
+                continue
+            try:
+                os.remove(self.blob_file(digest))
+            except FileNotFoundError:
+                pass
+            del self.blobs[digest]
+            total -= size
+
+    def get_manifest(self, repo, ref, accept=None):
+        """Return (content type, raw manifest), from the cache while it is fresh or upstream cannot be reached."""
+        path = os.path.join(self.manifests_dir, repo, ref.replace(':', '-'))
+        try:
+            with open(path + '.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(path, 'rb') as f:
+                cached = (meta['content_type'], f.read())
+            # A manifest addressed by digest never changes, one addressed by tag may move
+            if ref.startswith('sha256:') or time.time() - meta['fetched_at'] < self.manifest_ttl:
+                return cached
+        except (OSError, ValueError, KeyError):
+            cached = None
+        try:
+            response, _ = self.upstream.request(f"{self.upstream.base_url}/v2/{repo}/manifests/{ref}",
+                                                {'Accept': accept or manifest_media_type})
+            raw = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            if cached is not None:
+                return cached
+            raise MirrorError(502, f"Upstream registry unreachable: {e}")
+        if response.status != 200:
+            raise MirrorError(404 if response.status == 404 else 502, f"Upstream registry answered {response.status} {response.reason}")
+        content_type = response.getheader('Content-Type', manifest_media_type)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(raw)
+        os.replace(path + '.tmp', path)
+        with open(path + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'content_type': content_type, 'fetched_at': time.time()}, f)
+        return content_type, raw
+
+    def open_blob(self, repo, digest):
+        """
+        Return (size, state) for a blob, starting its upstream fetch unless it is cached or already on its way.
+        state is None for a complete blob, otherwise the shared fetch state to follow with read_fetch.
+        The caller calls release once it is done reading.
+        """
+        with self.lock:
+            if digest in self.blobs and os.path.exists(self.blob_file(digest)):
+                self.blobs[digest][1] = time.time()
+                try:
+                    os.utime(self.blob_file(digest))
+                except OSError:
+                    pass
+                self.readers[digest] = self.readers.get(digest, 0) + 1
+                return self.blobs[digest][0], None
+            state = self.fetches.get(digest)
+            if state is None:
+                state = {'size': None, 'written': 0, 'done': False, 'error': None}
+                self.fetches[digest] = state
+                threading.Thread(target=self.fetch_blob, args=(repo, digest, state), daemon=True).start()
+            while state['size'] is None and state['error'] is None:
+                self.lock.wait()
+            if state['error'] is not None:
+                raise state['error']
+            self.readers[digest] = self.readers.get(digest, 0) + 1
+            return state['size'], state
+
+    def release(self, digest):
+        """Let go of a blob opened with open_blob."""
+        with self.lock:
+            self.readers[digest] -= 1
+            if not self.readers[digest]:
+                del self.readers[digest]
+
+    def fetch_blob(self, repo, digest, state):
+        """Stream a blob from upstream into its partial file, verify it and add it to the cache."""
+        partial_file = self.blob_file(digest) + '.partial'
+        try:
+            response, _ = self.upstream.request(f"{self.upstream.base_url}/v2/{repo}/blobs/{digest}")
+            if response.status != 200:
+                response.read()
+                raise MirrorError(404 if response.status == 404 else 502, f"Upstream registry answered {response.status} {response.reason}")
+            size = int(response.getheader('Content-Length', -1))
+            if size < 0:
+                raise MirrorError(502, "Upstream registry did not send the blob size")
+            digest_hash = hashlib.sha256()
+            with open(partial_file, 'wb', buffering=0) as f:
+                with self.lock:
+                    self.evict(size)
+                    state['size'] = size
+                    self.lock.notify_all()
+                while state['written'] < size:
+                    data = response.read(min(1024 * 1024, size - state['written']))
+                    if not data:
+                        raise MirrorError(502, "Upstream registry closed the connection early")
+                    f.write(data)
+                    digest_hash.update(data)
+                    with self.lock:
+                        state['written'] += len(data)
+                        self.lock.notify_all()
+            if 'sha256:' + digest_hash.hexdigest() != digest:
+                raise MirrorError(502, f"Digest mismatch for blob {digest} from upstream")
+            with self.lock:
+                # Renamed under the lock so readers never look for the partial file of a finished fetch
+                os.replace(partial_file, self.blob_file(digest))
+                self.blobs[digest] = [size, time.time()]
+                state['done'] = True
+                del self.fetches[digest]
+                self.lock.notify_all()
+        except BaseException as e:
+            with self.lock:
+                state['error'] = e if isinstance(e, MirrorError) else MirrorError(502, f"Upstream fetch failed: {e}")
+                self.fetches.pop(digest, None)
+                self.lock.notify_all()
+            try:
+                os.remove(partial_file)
+            except OSError:
+                pass
+
+    def read_fetch(self, digest, state, start, end, write):
+        """Send bytes start..end (inclusive) of a blob that is still being fetched, as they arrive."""
+        position = start
+        while position <= end:
+            with self.lock:
+                while state['written'] <= position and not state['done'] and state['error'] is None:
+                    self.lock.wait()
+                if state['error'] is not None:
+                    raise state['error']
+                available = state['written']
+                # Once the fetch is done the partial file has been renamed to the complete blob
+                path = self.blob_file(digest) + ('' if state['done'] else '.partial')
+            # Opened for every piece so the fetch can rename the file while clients still read it
+            try:
+                with open(path, 'rb', buffering=0) as f:
+                    f.seek(position)
+                    data = f.read(min(1024 * 1024, min(available, end + 1) - position))
+            except FileNotFoundError:
+                continue  # Removed by a failed fetch just now, its state tells
+            if not data:
+                raise MirrorError(502, f"Blob {digest} ended early")
+            write(data)
+            position += len(data)
+
+    def serve(self, host='0.0.0.0', port=5000):
+        """Create the HTTP server of the mirror; the caller runs serve_forever on it."""
+        handler = type('Handler', (MirrorRequestHandler,), {'mirror': self})
+        server = http.server.ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        return server
+
+
+class MirrorRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Answers the registry API requests the model downloaders make: version check, manifests and blobs."""
+
+    protocol_version = 'HTTP/1.1'
+    mirror = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_error_response(self, status, message):
+        body = json.dumps({'errors': [{'message': message}]}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        try:
+            if path in ('/v2', '/v2/'):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(b'{}')
+                return
+            match = manifest_path_regex.match(path)
+            if match and '..' not in match.group('repo') and '..' not in match.group('ref'):
+                content_type, raw = self.mirror.get_manifest(match.group('repo'), match.group('ref'), self.headers.get('Accept'))
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(raw)
+                return
+            match = blob_path_regex.match(path)
+            if match and '..' not in match.group('repo'):
+                self.send_blob(match.group('repo'), match.group('digest'))
+                return
+            self.send_error_response(404, "Not found")
+        except MirrorError as e:
+            self.send_error_response(e.status, str(e))
+        except (ConnectionError, TimeoutError):
+            self.close_connection = True  # The client went away
+
+    def send_blob(self, repo, digest):
+        """Send a blob or the byte range the client asked for."""
+        size, state = self.mirror.open_blob(repo, digest)
+        try:
+            start, end = 0, size - 1
+            byte_range = range_regex.match(self.headers.get('Range', ''))
+            if byte_range:
+                start = int(byte_range.group(1))
+                end = min(int(byte_range.group(2)), size - 1) if byte_range.group(2) else size - 1
+                if start >= size or start > end:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f"bytes */{size}")
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Docker-Content-Digest', digest)
+            self.send_header('Content-Length', str(end - start + 1 if size else 0))
+            self.end_headers()
+            if self.command == 'HEAD' or not size:
+                return
+            try:
+                if state is not None:
+                    self.mirror.read_fetch(digest, state, start, end, self.wfile.write)
+                else:
+                    with open(self.mirror.blob_file(digest), 'rb') as f:
+                        f.seek(start)
+                        remaining = end - start + 1
+                        while remaining:
+                            data = f.read(min(1024 * 1024, remaining))
+                            if not data:
+                                break
+                            self.wfile.write(data)
+                            remaining -= len(data)
+            except MirrorError:
+                # The headers are out already, all that is left is to cut the response short
+                self.close_connection = True
+        finally:
+            self.mirror.release(digest)
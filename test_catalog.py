@@ -0,0 +1,285 @@
+import io
+import os
+import re
+import json
+import gzip
+import shutil
+import tempfile
+import unittest
+import contextlib
+import http.server
+from unittest import mock
+
+import benchmark
+import downloadModel
+from downloadModel import parse_catalog
+from downloadTelemetry import Telemetry
+
+
+# The per-model regex lookups parse_catalog replaced, kept as the reference it must agree with
+
+def extract_models(html):
+    """Extract models from HTML content"""
+    model_regex = r'<div x-test-model-title title="([^"]+)"'
+    matches = re.findall(model_regex, html)
+    return matches
+
+
+def extract_description(html, model):
+    """Extract description for a specific model"""
+    escaped_model = re.escape(model)
+    # Find the specific <li> element containing this model
+    pattern = f'<li[^>]*x-test-model[^>]*>(?:(?!<li[^>]*x-test-model[^>]*>).)*?<div[^>]*title="{escaped_model}".*?</li>'
+    model_block = re.search(pattern, html, re.DOTALL)
+
+    if model_block:
+        # Look for the description paragraph with specific classes that follows the title
+        desc_regex = r'<p class="max-w-lg[^"]*break-words text-neutral-800[^"]*">(.*?)</p>'
+        desc_match = re.search(desc_regex, model_block.group(), re.DOTALL)
+        if desc_match:
+            description = desc_match.group(1)
+            # Remove HTML tags if any remain
+            description = re.sub(r'<[^>]+>', '', description)
+            # Clean up whitespace
+            description = ' '.join(description.split())
+            return description
+    return "No description available"
+
+
+def extract_parameters(html, model):
+    """Extract parameters related to each model"""
+    escaped_model = re.escape(model)
+    # Find the specific <li> element containing this model
+    pattern = f'<li[^>]*x-test-model[^>]*>(?:(?!<li[^>]*x-test-model[^>]*>).)*?<div[^>]*title="{escaped_model}".*?</li>'
+    model_block = re.search(pattern, html, re.DOTALL)
+
+    if model_block:
+        # Only search for parameters within this model's block
+        param_regex = r'<span[^>]*x-test-size[^>]*>([^<]+)</span>'
+        param_matches = re.findall(param_regex, model_block.group())
+
+        params = [match.lower().strip() for match in param_matches]
+        if params:
+            return ",".join(params)
+    return "latest"
+
+
+def reference_catalog(html):
+    """Parse a library page with the reference lookups, one regex search per model."""
+    models = extract_models(html)
+    parameters = {model: extract_parameters(html, model) for model in models}
+    descriptions = {model: extract_description(html, model) for model in models}
+    return models, parameters, descriptions
+
+
+def model_block(title, sizes=(), description=None, inside=''):
+    """Return one <li> model block in the markup of the library page."""
+    html = (f'<li x-test-model class="flex items-baseline border-b border-neutral-200 py-6">'
+            f'<a href="/library/{title}" class="group w-full"><div class="flex flex-col">'
+            f'<div x-test-model-title title="{title}" class="flex"><h2 class="truncate"><span>{title}</span></h2>')
+    if description is not None:
+        html += f'<p class="max-w-lg break-words text-neutral-800 text-md">{description}</p>'
+    html += '</div><div class="flex flex-wrap space-x-2">'
+    html += ''.join(f'<span x-test-size class="inline-flex">{size}</span>' for size in sizes)
+    return html + inside + '</div></a></li>'
+
+
+def page(*blocks):
+    return '<html><body><ul role="list">' + '\n'.join(blocks) + '</ul></body></html>'
+
+
+class ParseCatalogTest(unittest.TestCase):
+
+    def assertMatchesReference(self, html):
+        self.assertEqual(parse_catalog(html), reference_catalog(html))
+
+    def test_synthetic_catalogs(self):
+        for num_models in (1, 50, 300):
+            with self.subTest(num_models=num_models):
+                self.assertMatchesReference(benchmark.synthetic_catalog(num_models))
+
+    def test_nested_list_items(self):
+        self.assertMatchesReference(page(
+            model_block('llama3', ['8B', '70b'], 'Meta <b>Llama</b> 3', inside='<ul><li>nested</li><li>two</li></ul>'),
+            model_block('qwen2', ['0.5b'], 'Qwen 2', inside='<ul><li>nested</li></ul>'),
+        ))
+
+    def test_duplicate_titles(self):
+        self.assertMatchesReference(page(
+            model_block('gemma', ['2b'], 'First'),
+            model_block('gemma', ['7b'], 'Second'),
+            model_block('phi3', ['3.8b'], 'Phi'),
+        ))
+
+    def test_missing_sizes_and_description(self):
+        html = page(
+            model_block('nomic-embed-text', [], 'Embeddings'),
+            model_block('tinyllama', ['1.1b']),
+            model_block('bare'),
+        )
+        self.assertMatchesReference(html)
+        _, parameters, descriptions = parse_catalog(html)
+        self.assertEqual(parameters['nomic-embed-text'], 'latest')
+        self.assertEqual(descriptions['tinyllama'], 'No description available')
+
+    def test_whitespace_and_tags_in_description(self):
+        self.assertMatchesReference(page(model_block('mistral', [' 7B '], 'Fast &amp; <i>small</i>\n   model')))
+
+    def test_title_outside_model_block(self):
+        self.assertMatchesReference(page(model_block('llama3', ['8b'], 'Llama')) +
+                                    '<div x-test-model-title title="stray" class="flex">')
+
+
+class FakeLibraryHandler(http.server.BaseHTTPRequestHandler):
+    """The library page of ollama.com, with an ETag, gzip and a transfer that can be cut short."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.send_header('ETag', self.server.etag)
+            self.end_headers()
+            return
+        body = self.server.page.encode('utf-8')
+        self.send_response(200)
+        if self.server.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.server.truncate:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class CatalogFilesTest(unittest.TestCase):
+    """Points the catalog files of downloadModel at a temporary directory."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='catalog-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.web_page_file = os.path.join(self.directory, 'modelListPage.html')
+        self.catalog_cache_file = os.path.join(self.directory, 'modelListPage.cache.json')
+        for name, value in (('web_page_file', self.web_page_file), ('catalog_cache_file', self.catalog_cache_file),
+                            ('telemetry', Telemetry())):
+            patcher = mock.patch.object(downloadModel, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_page(self, html):
+        with open(self.web_page_file, 'w', encoding='utf-8') as f:
+            f.write(html)
+
+
+class GetModelListTest(CatalogFilesTest):
+    """get_model_list against a local stand-in for the library page."""
+
+    def setUp(self):
+        super().setUp()
+        self.server = benchmark.FakeServer(FakeLibraryHandler)
+        self.addCleanup(self.server.shutdown)
+        self.server.page = benchmark.synthetic_catalog(30)
+        self.server.etag = '"v1"'
+        self.server.gzip = False
+        self.server.truncate = False
+        self.server.requests = []
+        patcher = mock.patch.object(downloadModel, 'model_list_url', self.server.url() + '/library?sort=newest')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return downloadModel.get_model_list()
+
+    def test_unchanged_list_reuses_cached_catalog(self):
+        catalog = self.fetch()
+        self.assertEqual(catalog, parse_catalog(self.server.page))
+        modified = os.stat(self.web_page_file).st_mtime_ns
+        # Served with the same ETag, so a changed page proves the 304 path did not download it
+        self.server.page = benchmark.synthetic_catalog(5)
+        self.assertEqual(self.fetch(), catalog)
+        self.assertEqual(self.server.requests[-1].get('If-None-Match'), '"v1"')
+        self.assertEqual(os.stat(self.web_page_file).st_mtime_ns, modified)
+
+    def test_gzip_body_is_decoded(self):
+        self.server.gzip = True
+        catalog = self.fetch()
+        self.assertIn('gzip', self.server.requests[-1].get('Accept-Encoding'))
+        self.assertEqual(catalog, parse_catalog(self.server.page))
+        with open(self.web_page_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), self.server.page)
+
+    def test_failed_refresh_keeps_existing_page(self):
+        old_page = benchmark.synthetic_catalog(3)
+        self.write_page(old_page)
+        self.server.etag = '"v2"'
+        self.server.truncate = True
+        with self.assertRaises(SystemExit):
+            self.fetch()
+        with open(self.web_page_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), old_page)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['modelListPage.html'])
+
+
+class CatalogCacheTest(CatalogFilesTest):
+    """The parsed catalog cache load_local_catalog reads instead of parsing modelListPage.html again."""
+
+    def setUp(self):
+        super().setUp()
+        self.html = benchmark.synthetic_catalog(20)
+        self.write_page(self.html)
+
+    def load(self, parse=True):
+        """Return load_local_catalog's catalog; with parse=False parsing the page fails the test."""
+        def no_parse(html):
+            self.fail("the page was parsed instead of read from the cache")
+        with mock.patch.object(downloadModel, 'extract_model_data', downloadModel.extract_model_data if parse else no_parse), \
+                contextlib.redirect_stdout(io.StringIO()):
+            return downloadModel.load_local_catalog()
+
+    def cache(self):
+        with open(self.catalog_cache_file, encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_warm_hit(self):
+        catalog = self.load()
+        self.assertEqual(catalog, parse_catalog(self.html))
+        self.assertEqual(self.load(parse=False), catalog)
+
+    def test_touched_file_is_rekeyed(self):
+        catalog = self.load()
+        stat = os.stat(self.web_page_file)
+        os.utime(self.web_page_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.load(parse=False), catalog)
+        self.assertEqual(self.cache()['mtime'], stat.st_mtime_ns + 10 ** 9)
+
+    def test_changed_content_is_parsed_again(self):
+        self.load()
+        changed = self.html.replace('llama', 'LLAMA')  # Same size, other content
+        self.assertNotEqual(changed, self.html)
+        self.write_page(changed)
+        stat = os.stat(self.web_page_file)
+        os.utime(self.web_page_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.load(), parse_catalog(changed))
+
+    def test_other_cache_version_is_ignored(self):
+        self.load()
+        cache = self.cache()
+        cache['version'] = downloadModel.CATALOG_CACHE_VERSION + 1
+        cache['models'] = ['stale']
+        with open(self.catalog_cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        self.assertEqual(self.load(), parse_catalog(self.html))
+        self.assertEqual(self.cache()['version'], downloadModel.CATALOG_CACHE_VERSION)
+
+
+if __name__ == '__main__':
+    unittest.main()
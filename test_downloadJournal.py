@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from downloadJournal import DownloadJournal
+
+
+class DownloadJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='journal-test-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'downloadQueue.jsonl')
+
+    def test_replay_restores_queue(self):
+        journal = DownloadJournal(self.path)
+        journal.start(['a:1b', 'b:2b', 'c:3b'], {'concurrency': 2})
+        journal.record('started', 'a:1b', attempt=1)
+        journal.record('failed', 'a:1b', attempt=1)
+        journal.record('requeued', 'a:1b')
+        journal.record('succeeded', 'b:2b')
+        loaded = DownloadJournal.load(self.path)
+        self.assertEqual(loaded.state['pending'], ['c:3b', 'a:1b'])
+        self.assertEqual(loaded.state['retry_count'], {'a:1b': 1})
+        self.assertEqual(loaded.state['settings'], {'concurrency': 2})
+
+    def test_event_after_torn_line_survives(self):
+        journal = DownloadJournal(self.path)
+        journal.start(['a:1b', 'b:2b'], {})
+        journal.file.write('{"event": "progress", "model": "a:1b", "compl')  # Killed halfway through a write
+        journal.file.close()
+        journal.file = None
+
+        loaded = DownloadJournal.load(self.path)
+        self.assertEqual(loaded.state['pending'], ['a:1b', 'b:2b'])
+        loaded.record('succeeded', 'a:1b')
+        self.assertEqual(DownloadJournal.load(self.path).state['pending'], ['b:2b'])
+
+    def test_compaction_keeps_state(self):
+        journal = DownloadJournal(self.path, compact_every=3)
+        journal.start(['a:1b', 'b:2b'], {'backend': 'registry'})
+        for attempt in range(1, 5):
+            journal.record('started', 'a:1b', attempt=attempt)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertLessEqual(len(f.readlines()), 3)
+        loaded = DownloadJournal.load(self.path)
+        self.assertEqual(loaded.state['pending'], ['a:1b', 'b:2b'])
+        self.assertEqual(loaded.state['retry_count'], {'a:1b': 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import io
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import contextlib
+from unittest import mock
+from datetime import datetime, timedelta
+
+import downloadModel
+import benchmark
+from downloadSchedule import DownloadSchedule
+from downloadTelemetry import Telemetry
+from registryMirror import RegistryMirror
+
+
+class DownloadModelsTest(unittest.TestCase):
+    """download_models against the fake Ollama server and registry of benchmark.py."""
+
+    def setUp(self):
+        self.models_dir = tempfile.mkdtemp(prefix='ollama-test-')
+        self.addCleanup(shutil.rmtree, self.models_dir, ignore_errors=True)
+        self.metrics_log = os.path.join(self.models_dir, 'metrics.jsonl')
+
+    def pull(self, ollama, models, schedule, backend='ollama', registry=None, max_attempts=20, **options):
+        """Download models through a backend and return the results dict and the elapsed seconds."""
+        results = {}
+        options.setdefault('concurrency', 1)
+        options.setdefault('pull', downloadModel.pull_backends[backend])
+        with benchmark.downloader_against(ollama.url(), (registry or ollama).url(), self.models_dir):
+            downloadModel.telemetry = Telemetry(self.metrics_log)
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.monotonic()
+                downloadModel.download_models(models, results=results, max_attempts=max_attempts, interactive=False,
+                                              show_progress=False, schedule=schedule, **options)
+                return results, time.monotonic() - started
+
+    def logged_models(self):
+        """Return the per-model summaries in the metrics log."""
+        with open(self.metrics_log, encoding='utf-8') as f:
+            return {event['model']: event for event in map(json.loads, f) if event['event'] == 'model'}
+
+    def test_rate_cap_bills_resumed_bytes_once(self):
+        # A pull paused for the cap resumes where it stopped; only the new bytes may count against the cap
+        model_size = 600_000
+        server = benchmark.fake_ollama(model_size, progress_lines=200)
+        self.addCleanup(server.shutdown)
+        # The deadline defers the model instead of letting a regression pause it forever
+        schedule = DownloadSchedule(max_rate=100_000, deadline=datetime.now() + timedelta(seconds=20),
+                                    backoff_base=0.01, backoff_max=0.05)
+        results, elapsed = self.pull(server, ['capped:1b'], schedule)
+        self.assertEqual(results['capped:1b']['status'], 'succeeded')
+        # 600 KB at 100 KB/s with a 200 KB burst takes about 4 s; billing resumed bytes again never finishes
+        self.assertGreater(elapsed, 2.0)
+        self.assertGreater(schedule.rate_limiter.tokens, -2 * schedule.rate_limiter.burst)
+
+
+    def test_logged_bytes_match_model_size_after_retries(self):
+        # Attempts that resume from earlier ones must not count the resumed bytes again
+        model_size = 1_000_000
+        schedule = DownloadSchedule(backoff_base=0.01, backoff_max=0.05)
+        ollama = benchmark.fake_ollama(model_size, failure_rate=0.6, seed=1)
+        ollama.models_dir = self.models_dir
+        self.addCleanup(ollama.shutdown)
+        registry = benchmark.fake_registry(['layered:1b'], [model_size // 2] * 2, failure_rate=0.6, seed=1)
+        self.addCleanup(registry.shutdown)
+        for backend, model in (('ollama', 'retried:1b'), ('registry', 'layered:1b')):
+            with self.subTest(backend=backend):
+                results, _ = self.pull(ollama, [model], schedule, backend, registry)
+                self.assertEqual(results[model]['status'], 'succeeded')
+                self.assertGreater(results[model]['attempts'], 1)
+                size = model_size if backend == 'ollama' else sum(len(blob) for blob in registry.blobs.values())
+                self.assertEqual(self.logged_models()[model]['bytes'], size)
+
+
+    def test_registry_pull_fails_when_server_uses_another_store(self):
+        ollama = benchmark.fake_ollama(1000)
+        ollama.models_dir = tempfile.mkdtemp(prefix='ollama-other-store-')  # The store the server really uses
+        self.addCleanup(shutil.rmtree, ollama.models_dir, ignore_errors=True)
+        self.addCleanup(ollama.shutdown)
+        registry = benchmark.fake_registry(['hidden:1b'], [1000])
+        self.addCleanup(registry.shutdown)
+        schedule = DownloadSchedule(backoff_base=0.01, backoff_max=0.05)
+        results, _ = self.pull(ollama, ['hidden:1b'], schedule, 'registry', registry, max_attempts=2)
+        self.assertEqual(results['hidden:1b']['status'], 'failed')
+
+        ollama.models_dir = self.models_dir
+        results, _ = self.pull(ollama, ['hidden:1b'], schedule, 'registry', registry, max_attempts=2)
+        self.assertEqual(results['hidden:1b']['status'], 'succeeded')
+
+
+    def test_admission_counts_shared_and_stored_layers_once(self):
+        plan = {'models': {'a:1b': {'blobs': ['x', 'y']}, 'b:1b': {'blobs': ['x', 'z']},
+                           'c:1b': {'blobs': ['w']}, 'd:1b': {'blobs': ['y', 'stored']}},
+                'blobs': {'x': 400, 'y': 100, 'z': 300, 'w': 500, 'stored': 1000}, 'local': {'stored'}}
+        with mock.patch.object(downloadModel, 'models_disk_free', return_value=1000), \
+                mock.patch.object(downloadModel, 'disk_reserve', 100), \
+                mock.patch.object(downloadModel, 'model_sizes', {'sized:1b': (50, 0)}):
+            admission = downloadModel.admit_models(['a:1b', 'b:1b', 'c:1b', 'd:1b', 'sized:1b', 'unknown:1b'], plan)
+        # a adds 500 and b 300 next to it; c does not fit after them, d only needs what a already brings
+        self.assertEqual(admission['fits'], ['a:1b', 'b:1b', 'd:1b', 'sized:1b', 'unknown:1b'])
+        self.assertEqual(admission['too_big'], ['c:1b'])
+        self.assertEqual(admission['unknown'], ['unknown:1b'])
+        self.assertEqual(admission['needed'], {'a:1b': 500, 'b:1b': 300, 'c:1b': 500, 'd:1b': 0, 'sized:1b': 50})
+        self.assertEqual(admission['total'], 850)
+
+
+    def test_model_too_big_for_disk_is_deferred(self):
+        # Waiting for space the model can never get would hold up every model behind it
+        server = benchmark.fake_ollama(1000)
+        self.addCleanup(server.shutdown)
+        schedule = DownloadSchedule(disk_path=self.models_dir, backoff_base=0.01, backoff_max=0.05)
+        outcome = []
+        with mock.patch.object(schedule, 'free_space', return_value=10_000_000):
+            # In a thread, so a regression that waits on the disk fails the test instead of hanging it
+            thread = threading.Thread(target=lambda: outcome.append(self.pull(
+                server, ['huge:1b', 'small:1b'], schedule, disk_needs={'huge:1b': 20_000_000, 'small:1b': 1000})),
+                daemon=True)
+            thread.start()
+            thread.join(10)
+        self.assertTrue(outcome, "the queue waited for disk space the first model never gets")
+        results, _ = outcome[0]
+        self.assertEqual(results['huge:1b']['status'], 'deferred')
+        self.assertEqual(results['huge:1b']['attempts'], 0)
+        self.assertEqual(results['small:1b']['status'], 'succeeded')
+
+
+    def test_model_waits_for_space_of_running_pull(self):
+        # Each model fits on its own but not next to the other, so they are pulled one after the other
+        server = benchmark.fake_ollama(1000)
+        self.addCleanup(server.shutdown)
+        schedule = DownloadSchedule(disk_path=self.models_dir, backoff_base=0.01, backoff_max=0.05)
+        running = {'now': 0, 'most': 0}
+        lock = threading.Lock()
+
+        def pull(model, on_progress=None, should_stop=None):
+            with lock:
+                running['now'] += 1
+                running['most'] = max(running['most'], running['now'])
+            time.sleep(0.3)
+            with lock:
+                running['now'] -= 1
+            return True
+
+        with mock.patch.object(schedule, 'free_space', return_value=10_000_000), \
+                mock.patch.object(schedule, 'seconds_until_allowed', return_value=0.1):
+            results, _ = self.pull(server, ['first:1b', 'second:1b'], schedule, concurrency=2, pull=pull,
+                                   disk_needs={'first:1b': 6_000_000, 'second:1b': 6_000_000})
+        self.assertEqual([result['status'] for result in results.values()], ['succeeded', 'succeeded'])
+        self.assertEqual(running['most'], 1)
+
+
+    def test_mirror_only_client_retries_instead_of_waiting_for_internet(self):
+        # Behind a mirror the registry itself may be unreachable; the mirror answering is connectivity enough
+        ollama = benchmark.fake_ollama(1000)
+        self.addCleanup(ollama.shutdown)
+        registry = benchmark.fake_registry(['llama:1b'], [1000])
+        self.addCleanup(registry.shutdown)
+        mirror = RegistryMirror(os.path.join(self.models_dir, 'mirror'), registry.url())
+        server = mirror.serve('127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        check_internet = downloadModel.check_internet
+        results = {}
+
+        def pull():
+            with benchmark.downloader_against(ollama.url(), 'http://127.0.0.1:9', self.models_dir), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                downloadModel.check_internet = check_internet  # The real probe, not the fake servers' stand-in
+                downloadModel.registry_downloader.mirror_url = f"http://127.0.0.1:{server.server_port}"
+                downloadModel.download_models(['missing:1b'], 1, downloadModel.pull_with_registry, results=results,
+                                              max_attempts=2, interactive=False, show_progress=False,
+                                              schedule=DownloadSchedule(backoff_base=0.01, backoff_max=0.05))
+
+        # In a thread, so a regression that waits for the internet fails the test instead of hanging it
+        thread = threading.Thread(target=pull, daemon=True)
+        thread.start()
+        thread.join(20)
+        self.assertFalse(thread.is_alive(), "the pull waited for an internet connection instead of retrying")
+        self.assertEqual(results['missing:1b']['status'], 'failed')
+        self.assertEqual(results['missing:1b']['attempts'], 2)
+
+
+    def test_size_cache_has_its_own_version(self):
+        sizes_file = os.path.join(self.models_dir, 'modelSizes.cache.json')
+        with mock.patch.object(downloadModel, 'model_sizes_file', sizes_file), \
+                mock.patch.object(downloadModel, 'model_sizes', {'llama:1b': (1000, 5.0)}):
+            downloadModel.save_size_cache()
+        # A new catalog cache layout keeps the sizes, a new size cache layout drops them
+        for constant, kept in (('CATALOG_CACHE_VERSION', True), ('SIZE_CACHE_VERSION', False)):
+            with self.subTest(bumped=constant), mock.patch.object(downloadModel, 'model_sizes_file', sizes_file), \
+                    mock.patch.object(downloadModel, 'model_sizes', {}), \
+                    mock.patch.object(downloadModel, constant, getattr(downloadModel, constant) + 1):
+                downloadModel.load_size_cache()
+                self.assertEqual(downloadModel.model_sizes, {'llama:1b': (1000, 5.0)} if kept else {})
+
+
+    def test_batch_interrupted_before_downloading_writes_report(self):
+        report_file = os.path.join(self.models_dir, 'report.json')
+        args = downloadModel.parse_args(['--filter', 'coder', '--refresh-catalog', '--json', report_file])
+
+        def get_model_list():
+            raise KeyboardInterrupt  # Ctrl+C while the catalog is fetched
+
+        with mock.patch.object(downloadModel, 'get_model_list', get_model_list), \
+                contextlib.redirect_stdout(io.StringIO()):
+            exit_code = downloadModel.run_batch(args)
+        self.assertEqual(exit_code, downloadModel.EXIT_INTERRUPTED)
+        with open(report_file, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(report['exit_code'], downloadModel.EXIT_INTERRUPTED)
+        self.assertEqual(report['models'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
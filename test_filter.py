@@ -0,0 +1,168 @@
+import re
+import operator
+import unittest
+
+import benchmark
+from downloadModel import build_catalog_index, filter_catalog, extract_model_data
+
+
+# The linear scan display_models filtered with before the catalog index, kept as the reference for single terms
+
+def parse_param(param):
+    """Convert parameter string like '8b', '700k', '10.5m' to a float for comparison."""
+    match = re.match(r'(\d+(\.\d+)?)([kmgb])', param.lower())
+    if not match:
+        return None
+    num, _, unit = match.groups()
+    multiplier = {'k': 1_000, 'm': 1_000_000, 'b': 1_000_000_000, 'g': 1_000_000_000}[unit]
+    return float(num) * multiplier
+
+
+comparisons = {'=': operator.eq, '==': operator.eq, '>': operator.gt, '>=': operator.ge,
+               '<': operator.lt, '<=': operator.le}
+
+
+def linear_scan(models, parameters, filter_keyword):
+    """Return the model:parameter entries matching one keyword or size comparison, in catalog order."""
+    param_filter = None
+    if filter_keyword and re.match(r'[<>=]=?\d+(\.\d+)?[kmgb]', filter_keyword.lower()):
+        op = filter_keyword[:2] if filter_keyword[1] in "=<>" else filter_keyword[0]
+        param_filter = (op, filter_keyword[len(op):])
+
+    def matches_filter(param):
+        op, value = param_filter
+        param_value = parse_param(param)
+        filter_value = parse_param(value)
+        if param_value is None or filter_value is None:
+            return False
+        return comparisons[op](param_value, filter_value)
+
+    entries = []
+    for model in models:
+        for param in parameters[model].split(','):
+            param = param.strip()
+            if param_filter and not matches_filter(param):
+                continue
+            entry = f"{model}:{param}"
+            if filter_keyword and not param_filter and filter_keyword.lower() not in entry.lower():
+                continue
+            entries.append(entry)
+    return entries
+
+
+def linear_expression(models, parameters, groups):
+    """Return the entries matching any group of terms that all have to match, in catalog order."""
+    matched = set()
+    for terms in groups:
+        group = None
+        for term in terms:
+            entries = set(linear_scan(models, parameters, term))
+            group = entries if group is None else group & entries
+        matched |= group or set()
+    return [entry for entry in linear_scan(models, parameters, None) if entry in matched]
+
+
+class FilterCatalogTest(unittest.TestCase):
+    """filter_catalog against a small hand-made catalog and against the linear scan it replaced."""
+
+    models = ['alpha', 'beta', 'xabcx-bcdx']
+    parameters = {'alpha': '1b, 7b, 8b', 'beta': '700m, 7b, 70b', 'xabcx-bcdx': '1.5b'}
+
+    def setUp(self):
+        self.index = build_catalog_index(self.models, self.parameters)
+
+    def matches(self, expression):
+        positions = filter_catalog(self.index, expression)
+        return None if positions is None else [self.index['entries'][position] for position in positions]
+
+    def test_no_filter(self):
+        for expression in (None, '', '   '):
+            self.assertIsNone(filter_catalog(self.index, expression))
+
+    def test_size_operators_at_their_boundary(self):
+        cases = {
+            '=7b': ['alpha:7b', 'beta:7b'],
+            '==7b': ['alpha:7b', 'beta:7b'],
+            '>=7b': ['alpha:7b', 'alpha:8b', 'beta:7b', 'beta:70b'],
+            '>7b': ['alpha:8b', 'beta:70b'],
+            '<=7b': ['alpha:1b', 'alpha:7b', 'beta:700m', 'beta:7b', 'xabcx-bcdx:1.5b'],
+            '<7b': ['alpha:1b', 'beta:700m', 'xabcx-bcdx:1.5b'],
+            '>=1.5b': ['alpha:7b', 'alpha:8b', 'beta:7b', 'beta:70b', 'xabcx-bcdx:1.5b'],
+            '<0.7b': [],
+            '<=700m': ['beta:700m'],
+            '=8g': ['alpha:8b'],
+        }
+        for expression, expected in cases.items():
+            with self.subTest(expression=expression):
+                self.assertEqual(self.matches(expression), expected)
+
+    def test_size_term_with_trailing_text_is_a_keyword(self):
+        # The linear scan read '>7b8' as '>7b' by matching a prefix; a size term now has to be the whole term
+        self.assertEqual(linear_scan(self.models, self.parameters, '>7b8'), ['alpha:8b', 'beta:70b'])
+        self.assertEqual(self.matches('>7b8'), [])
+
+    def test_short_keywords(self):
+        cases = {
+            'b': ['alpha:1b', 'alpha:7b', 'alpha:8b', 'beta:700m', 'beta:7b', 'beta:70b', 'xabcx-bcdx:1.5b'],
+            '7': ['alpha:7b', 'beta:700m', 'beta:7b', 'beta:70b'],
+            'a:7': ['alpha:7b', 'beta:700m', 'beta:7b', 'beta:70b'],
+            'A:7': ['alpha:7b', 'beta:700m', 'beta:7b', 'beta:70b'],
+            'zz': [],
+        }
+        for expression, expected in cases.items():
+            with self.subTest(expression=expression):
+                self.assertEqual(self.matches(expression), expected)
+
+    def test_long_keywords(self):
+        cases = {
+            'beta:70': ['beta:700m', 'beta:70b'],
+            'BETA:70B': ['beta:70b'],
+            'xabcx-bcdx:1.5b': ['xabcx-bcdx:1.5b'],
+            # Every 3-gram of 'abcd' is in 'xabcx-bcdx', the keyword itself is not
+            'abcd': [],
+            'alphabet': [],
+        }
+        for expression, expected in cases.items():
+            with self.subTest(expression=expression):
+                self.assertEqual(self.matches(expression), expected)
+
+    def test_and_groups(self):
+        for expression in ('beta >=7b', 'beta and >=7b', 'beta & >=7b', 'beta AND >=7b'):
+            with self.subTest(expression=expression):
+                self.assertEqual(self.matches(expression), ['beta:7b', 'beta:70b'])
+        self.assertEqual(self.matches('alpha >1b <8b'), ['alpha:7b'])
+        self.assertEqual(self.matches('alpha beta'), [])
+
+    def test_or_groups(self):
+        for expression in ('alpha:1b | beta:70b', 'alpha:1b|beta:70b', 'alpha:1b or beta:70b', 'alpha:1b OR beta:70b'):
+            with self.subTest(expression=expression):
+                self.assertEqual(self.matches(expression), ['alpha:1b', 'beta:70b'])
+        self.assertEqual(self.matches('alpha >7b | beta <1b'), ['alpha:8b', 'beta:700m'])
+        self.assertEqual(self.matches('alpha | alpha:7b'), ['alpha:1b', 'alpha:7b', 'alpha:8b'])
+
+    def test_empty_groups(self):
+        self.assertEqual(self.matches('| alpha:1b'), ['alpha:1b'])
+        self.assertEqual(self.matches('alpha:1b |'), ['alpha:1b'])
+        self.assertEqual(self.matches('alpha:1b || beta:7b'), ['alpha:1b', 'beta:7b'])
+        self.assertEqual(self.matches('and'), [])
+        self.assertEqual(self.matches('|'), [])
+
+    def test_synthetic_catalog_matches_linear_scan(self):
+        models, parameters, _ = extract_model_data(benchmark.synthetic_catalog(500))
+        index = build_catalog_index(models, parameters)
+        terms = (['coder', 'llama', 'QWEN', 'b', '3.1', 'a-7', 'vision-4', 'nothing-like-this']
+                 + [f"{op}{size}" for op in comparisons for size in benchmark.size_tags])
+        for term in terms:
+            with self.subTest(term=term):
+                entries = [index['entries'][position] for position in filter_catalog(index, term)]
+                self.assertEqual(entries, linear_scan(models, parameters, term))
+        for expression in benchmark.filter_expressions:
+            groups = [[term for term in group.split() if term not in ('and', '&')]
+                      for group in re.split(r'\s*\|\s*|\s+or\s+', expression)]
+            with self.subTest(expression=expression):
+                entries = [index['entries'][position] for position in filter_catalog(index, expression)]
+                self.assertEqual(entries, linear_expression(models, parameters, groups))
+
+
+if __name__ == '__main__':
+    unittest.main()
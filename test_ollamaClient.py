@@ -0,0 +1,53 @@
+import json
+import time
+import unittest
+
+import benchmark
+from ollamaClient import OllamaClient, ollama_base_url
+
+
+class SlowVerifyHandler(benchmark.FakeOllamaHandler):
+    """Fake Ollama server that stays silent while it verifies a pulled model, like the real one does."""
+
+    def do_POST(self):
+        if self.path != '/api/pull':
+            super().do_POST()
+            return
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for update in ({'status': 'pulling manifest'}, {'status': 'verifying sha256 digest'}, None, {'status': 'success'}):
+            if update is None:
+                time.sleep(self.server.verify_seconds)
+                continue
+            line = (json.dumps(update) + '\n').encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class OllamaClientTest(unittest.TestCase):
+
+    def test_base_url_forms(self):
+        self.assertEqual(ollama_base_url('0.0.0.0'), 'http://127.0.0.1:11434')
+        self.assertEqual(ollama_base_url(':8080'), 'http://127.0.0.1:8080')
+        self.assertEqual(ollama_base_url('https://example.com'), 'https://example.com:443')
+        self.assertEqual(ollama_base_url('::1'), 'http://[::1]:11434')
+
+    def test_pull_outlasts_read_timeout_while_verifying(self):
+        server = benchmark.FakeServer(SlowVerifyHandler)
+        server.verify_seconds = 1.0
+        self.addCleanup(server.shutdown)
+        client = OllamaClient(server.url(), timeout=0.3)
+        statuses = []
+        self.assertTrue(client.pull('slow:1b', lambda completed, total, status, new_bytes: statuses.append(status)))
+        self.assertEqual(statuses[-1], 'success')
+        # The keep-alive connection gets its timeout back for the other requests
+        self.assertEqual(client.local.conn.sock.gettimeout(), 0.3)
+        self.assertIn('details', client.show('slow:1b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
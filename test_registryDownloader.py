@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmark
+from registryDownloader import RegistryDownloader, RegistryError, ManifestNotFound, manifest_layers
+
+
+class NoRangeHandler(benchmark.FakeRegistryHandler):
+    """Fake registry whose CDN ignores Range headers and always sends the whole blob."""
+
+    def do_GET(self):
+        del self.headers['Range']
+        super().do_GET()
+
+
+class RegistryDownloaderTest(unittest.TestCase):
+    """RegistryDownloader against the fake registry of benchmark.py."""
+
+    def setUp(self):
+        self.models_dir = tempfile.mkdtemp(prefix='registry-test-')
+        self.addCleanup(shutil.rmtree, self.models_dir, ignore_errors=True)
+
+    def registry(self, models, layer_sizes, **kwargs):
+        server = benchmark.fake_registry(models, layer_sizes, **kwargs)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def downloader(self, server):
+        # Small sequential chunks, so a pull can be stopped partway through a blob
+        return RegistryDownloader(server.url(), self.models_dir, connections=1, chunk_size=128 * 1024)
+
+    def layer(self, downloader, model):
+        """Return the digest and size of a model's first layer."""
+        manifest, _ = downloader.fetch_manifest(model)
+        layer = manifest_layers(manifest)[0]
+        return layer['digest'], layer['size']
+
+    def assertBlobMatches(self, downloader, server, digest):
+        with open(downloader.blob_path(digest), 'rb') as f:
+            self.assertEqual(f.read(), server.blobs[digest])
+
+    def test_pull_installs_verified_blobs_and_manifest(self):
+        server = self.registry(['llama:1b'], [700_000, 300_000])
+        downloader = self.downloader(server)
+        self.assertTrue(downloader.pull('llama:1b'))
+        for digest in server.blobs:
+            self.assertBlobMatches(downloader, server, digest)
+        self.assertTrue(os.path.exists(downloader.manifest_path('llama:1b')))
+
+    def test_unknown_model(self):
+        downloader = self.downloader(self.registry(['llama:1b'], [1000]))
+        with self.assertRaises(ManifestNotFound):
+            downloader.pull('missing:1b')
+
+    def test_cancel_and_resume_from_partial(self):
+        server = self.registry(['llama:1b'], [2_000_000], latency=0.02)
+        downloader = self.downloader(server)
+        digest, size = self.layer(downloader, 'llama:1b')
+        progress = {'completed': 0, 'new': 0}
+
+        def on_progress(completed, total, status, new_bytes):
+            progress['completed'] = completed
+            progress['new'] += new_bytes
+
+        self.assertFalse(downloader.pull('llama:1b', on_progress, lambda: progress['completed'] >= 500_000))
+        partial_file = downloader.blob_path(digest) + '.partial'
+        self.assertTrue(os.path.exists(partial_file))
+        self.assertTrue(os.path.exists(partial_file + '.json'))
+        self.assertFalse(os.path.exists(downloader.blob_path(digest)))
+
+        first_attempt = progress['new']
+        progress['new'] = 0
+        self.assertTrue(downloader.pull('llama:1b', on_progress))
+        self.assertBlobMatches(downloader, server, digest)
+        self.assertFalse(os.path.exists(partial_file))
+        # The second pull only transfers what the first one left
+        self.assertGreater(first_attempt, 0)
+        self.assertLess(progress['new'], size)
+
+    def test_digest_mismatch_discards_partial(self):
+        server = self.registry(['llama:1b'], [600_000])
+        downloader = self.downloader(server)
+        digest, size = self.layer(downloader, 'llama:1b')
+        server.blobs[digest] = os.urandom(size)  # Same size, wrong content
+        with self.assertRaises(RegistryError):
+            downloader.pull('llama:1b')
+        blob_file = downloader.blob_path(digest)
+        self.assertFalse(os.path.exists(blob_file))
+        self.assertFalse(os.path.exists(blob_file + '.partial'))
+        self.assertFalse(os.path.exists(blob_file + '.partial.json'))
+
+    def test_server_without_range_support(self):
+        server = self.registry(['llama:1b'], [1_000_000], latency=0.02)
+        downloader = self.downloader(server)
+        digest, _ = self.layer(downloader, 'llama:1b')
+        progress = {'completed': 0}
+
+        def on_progress(completed, total, status, new_bytes):
+            progress['completed'] = completed
+
+        # Leave a partial file from a ranged download behind, then lose range support
+        self.assertFalse(downloader.pull('llama:1b', on_progress, lambda: progress['completed'] >= 300_000))
+        server.RequestHandlerClass = NoRangeHandler
+        self.assertTrue(self.downloader(server).pull('llama:1b'))
+        self.assertBlobMatches(downloader, server, digest)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import http.client
+from collections import Counter
+
+import benchmark
+from registryDownloader import RegistryDownloader, manifest_layers
+from registryMirror import RegistryMirror
+
+
+class CountingRegistryHandler(benchmark.FakeRegistryHandler):
+    """Fake registry that counts the blob transfers it serves."""
+
+    def do_GET(self):
+        if self.path.startswith('/cdn/'):
+            with self.server.rng_lock:
+                self.server.blob_requests[self.path[len('/cdn/'):]] += 1
+        super().do_GET()
+
+
+class RegistryMirrorTest(unittest.TestCase):
+    """RegistryMirror in front of the fake registry of benchmark.py."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='mirror-test-')
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+
+    def registry(self, models, layer_sizes, **kwargs):
+        server = benchmark.fake_registry(models, layer_sizes, **kwargs)
+        server.blob_requests = Counter()
+        server.RequestHandlerClass = CountingRegistryHandler
+        self.addCleanup(server.shutdown)
+        return server
+
+    def mirror(self, upstream, **kwargs):
+        """Start a mirror of upstream and return it and its URL."""
+        mirror = RegistryMirror(os.path.join(self.temp_dir, 'cache'), upstream.url(), **kwargs)
+        server = mirror.serve('127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return mirror, f"http://127.0.0.1:{server.server_port}"
+
+    def client(self, upstream, mirror_url):
+        """Return a downloader with a model store of its own, as on another machine."""
+        models_dir = tempfile.mkdtemp(dir=self.temp_dir)
+        return RegistryDownloader(upstream.url(), models_dir, connections=2, chunk_size=128 * 1024, mirror_url=mirror_url)
+
+    def get(self, mirror_url, path):
+        """Return (status, body) of a GET request to the mirror."""
+        conn = http.client.HTTPConnection(mirror_url[len('http://'):], timeout=10)
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    def test_concurrent_pulls_fetch_each_blob_once(self):
+        upstream = self.registry(['llama:1b'], [800_000, 400_000], latency=0.05)
+        _, mirror_url = self.mirror(upstream)
+        clients = [self.client(upstream, mirror_url) for _ in range(4)]
+        results = []
+        threads = [threading.Thread(target=lambda client=client: results.append(client.pull('llama:1b')))
+                   for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+        self.assertEqual(results, [True] * len(clients))
+        self.assertEqual(upstream.blob_requests, Counter(dict.fromkeys(upstream.blobs, 1)))
+        for client in clients:
+            for digest, data in upstream.blobs.items():
+                with open(client.blob_path(digest), 'rb') as f:
+                    self.assertEqual(f.read(), data)
+
+    def test_least_recently_used_blobs_are_evicted(self):
+        upstream = self.registry(['a:1b', 'b:1b', 'c:1b'], [300_000])
+        mirror, mirror_url = self.mirror(upstream, max_bytes=700_000)
+        layers = {}
+        for model in ('a:1b', 'b:1b', 'a:1b', 'c:1b'):  # Pulling a again makes b the least recently used
+            client = self.client(upstream, mirror_url)
+            self.assertTrue(client.pull(model))
+            layers[model] = manifest_layers(client.fetch_manifest(model)[0])[0]['digest']
+        with mirror.lock:
+            self.assertNotIn(layers['b:1b'], mirror.blobs)
+            self.assertIn(layers['a:1b'], mirror.blobs)
+            self.assertIn(layers['c:1b'], mirror.blobs)
+            self.assertLessEqual(mirror.cached_bytes(), mirror.max_bytes)
+        self.assertFalse(os.path.exists(mirror.blob_file(layers['b:1b'])))
+
+        # An evicted blob is fetched from upstream again on demand
+        self.assertTrue(self.client(upstream, mirror_url).pull('b:1b'))
+        self.assertEqual(upstream.blob_requests[layers['b:1b']], 2)
+
+    def test_unknown_manifest_is_passed_through_as_404(self):
+        upstream = self.registry(['llama:1b'], [1000])
+        _, mirror_url = self.mirror(upstream)
+        status, _ = self.get(mirror_url, '/v2/library/missing/manifests/1b')
+        self.assertEqual(status, 404)
+        status, _ = self.get(mirror_url, '/v2/library/llama/blobs/sha256:' + '0' * 64)
+        self.assertEqual(status, 404)
+
+    def test_stale_manifest_is_served_when_upstream_is_down(self):
+        upstream = self.registry(['llama:1b'], [1000])
+        _, mirror_url = self.mirror(upstream, manifest_ttl=0)
+        status, cached = self.get(mirror_url, '/v2/library/llama/manifests/1b')
+        self.assertEqual(status, 200)
+        upstream.shutdown()
+        upstream.server_close()
+        status, body = self.get(mirror_url, '/v2/library/llama/manifests/1b')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, cached)
+
+
+if __name__ == '__main__':
+    unittest.main()